@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+u"""
+    Micro-benchmark of ROSTypeFile.parse
+
+    Compares the single-pass parser with the line-by-line parser it
+    replaced on generated type files with many constants::
+
+        $ python benchmarks/parser.py [number of constants ...]
+"""
+from __future__ import print_function
+
+import os
+import pickle
+import re
+import sys
+import timeit
+
+from docutils.statemachine import StringList
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from sphinxcontrib.ros.message import BUILTIN_TYPES, ROSMessageBase  # noqa
+
+
+class LegacyROSField(object):
+    u"""The field before the slotted record, for reference
+    """
+    matcher = re.compile(r'([\w/]+)(\s*\[\s*\d*\s*\])?'
+                         '\s+(\w+)(\s*=\s*[^#]+)?(\s*)(#.*)?$')
+
+    def __init__(self, line, source=None, offset=0,
+                 pre_comments='', package_name=''):
+        self.source = source
+        self.offset = offset
+        result = self.matcher.match(line)
+        if result is None:
+            self.name = None
+            return
+        self.name = result.group(3)
+        self.type = result.group(1)
+        self.size = result.group(2).replace(' ', '') if result.group(2) else ''
+        self.value = result.group(4).lstrip()[1:] if result.group(4) else ''
+        comment = result.group(6) if result.group(6) else ''
+        if self.type == 'string' and self.value:
+            self.value += result.group(5) + comment
+            comment = ''
+        else:
+            self.value = self.value.strip()
+            comment = comment[1:]
+        if self.type not in BUILTIN_TYPES:
+            if '/' not in self.type:
+                self.type = package_name + '/' + self.type
+        elif self.type == 'Header':
+            self.type = 'std_msgs/Header'
+        self.comment = StringList([comment], items=[(source, offset)])
+        self.pre_comments = pre_comments
+        self.post_comments = StringList()
+
+
+def legacy_parse(file_content, package_name):
+    u"""The parser before the single-pass tokenizer, for reference
+    """
+    all_fields = []
+    fields = []
+    pre_comments = StringList()
+    for item in file_content.xitems():  # (source, offset, value)
+        line = item[2].strip()
+        if line and not [c for c in line if not c == '-']:
+            all_fields.append(fields)
+            fields = []
+        elif line == '' or line[0] == '#':
+            if line:
+                line = line[1:]
+            if fields:
+                fields[-1].post_comments.append(line,
+                                                source=item[0],
+                                                offset=item[1])
+            pre_comments.append(line, source=item[0], offset=item[1])
+        else:
+            new_field = LegacyROSField(line, source=item[0], offset=item[1],
+                                       pre_comments=pre_comments,
+                                       package_name=package_name)
+            if new_field.name:
+                fields.append(new_field)
+                pre_comments = StringList()
+    all_fields.append(fields)
+    return all_fields
+
+
+def generate(num_constants):
+    lines = ['# A generated message', '#', '# with a long description', '']
+    for i in range(num_constants):
+        lines.append('# constant %d' % i)
+        lines.append('uint32 CONSTANT_%d = %d # value %d' % (i, i, i))
+        if i % 10 == 0:
+            lines.append('')
+    lines.append('Header header')
+    lines.append('geometry_msgs/Pose[] poses # poses')
+    return StringList(lines, source='Generated.msg')
+
+
+def main(sizes):
+    type_file = ROSMessageBase.type_file
+    for size in sizes:
+        content = generate(size)
+        number = max(1, 20000 // size)
+        legacy = min(timeit.repeat(
+            lambda: legacy_parse(content, 'pkg'), number=number, repeat=3))
+        current = min(timeit.repeat(
+            lambda: type_file.parse(content, 'pkg'), number=number, repeat=3))
+        legacy_size = len(pickle.dumps(legacy_parse(content, 'pkg'),
+                                       pickle.HIGHEST_PROTOCOL))
+        current_size = len(pickle.dumps(type_file.parse(content, 'pkg'),
+                                        pickle.HIGHEST_PROTOCOL))
+        print('{0:>6} constants: legacy {1:8.3f} ms, '
+              'current {2:8.3f} ms, speedup {3:.2f}x, '
+              'pickle {4} -> {5} bytes'.format(
+                  size, legacy / number * 1000, current / number * 1000,
+                  legacy / current, legacy_size, current_size))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100, 1000, 10000])
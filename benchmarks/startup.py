@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+u"""
+    Benchmark of the startup cost of the extension
+
+    Measures, in fresh processes, the time to import the extension once
+    Sphinx is imported and the time to set up a Sphinx application of an
+    empty project with and without the extension, and lists the heavy
+    modules loaded by importing the extension::
+
+        $ python benchmarks/startup.py [--repeat R] [src directory ...]
+
+    Give the ``src`` directories of several trees, e.g. of a git worktree
+    of an older revision, to compare them. Defaults to this tree.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+MEASURE = u"""
+import json, os, shutil, sys, tempfile, time
+sys.path.insert(0, {src!r})
+from sphinx.application import Sphinx
+loaded = set(sys.modules)
+start = time.time()
+import sphinxcontrib.ros
+imported = time.time() - start
+modules = sorted(m for m, module in sys.modules.items()
+                 if module is not None and m not in loaded and
+                 m.startswith({heavy!r}))
+srcdir = tempfile.mkdtemp()
+open(os.path.join(srcdir, 'conf.py'), 'w').write({conf!r})
+start = time.time()
+Sphinx(srcdir, srcdir, os.path.join(srcdir, '_build'),
+       os.path.join(srcdir, '_build', 'doctrees'), 'html', status=None)
+setup = time.time() - start
+shutil.rmtree(srcdir)
+print(json.dumps({{'import': imported, 'setup': setup, 'modules': modules}}))
+"""
+
+HEAVY_MODULES = ('catkin_pkg', 'pygments.lexer', 'pygments.regexopt',
+                 'xml.dom', 'sqlite3', 'argparse', 'multiprocessing')
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def measure(src, extensions, repeat):
+    code = MEASURE.format(src=os.path.abspath(src),
+                          conf='extensions = {0!r}\n'.format(extensions),
+                          heavy=HEAVY_MODULES)
+    results = [json.loads(subprocess.check_output([sys.executable, '-c',
+                                                   code]).decode('utf-8'))
+               for _ in range(repeat)]
+    return {'import': median([r['import'] for r in results]),
+            'setup': median([r['setup'] for r in results]),
+            'modules': results[0]['modules']}
+
+
+def main():
+    default_src = os.path.join(os.path.dirname(__file__), '..', 'src')
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1]
+                                     .strip())
+    parser.add_argument('src', nargs='*', default=[default_src])
+    parser.add_argument('--repeat', type=int, default=11)
+    args = parser.parse_args()
+    for src in args.src:
+        bare = measure(src, [], args.repeat)
+        ros = measure(src, ['sphinxcontrib.ros'], args.repeat)
+        print('{0}\n  import {1:7.1f} ms, setup {2:7.1f} ms '
+              '(without the extension {3:7.1f} ms)\n  heavy modules: {4}'
+              .format(src, ros['import'] * 1000, ros['setup'] * 1000,
+                      bare['setup'] * 1000,
+                      ', '.join(ros['modules']) or 'none'))
+
+
+if __name__ == '__main__':
+    main()
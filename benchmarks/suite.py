@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+u"""
+    Benchmark suite of the auto directives
+
+    Generates a synthetic workspace (see ``workspace.py``) and measures
+    each phase in a fresh process, recording the best time of the repeats
+    and the peak RSS of the process::
+
+        $ python benchmarks/suite.py [--packages N] [--messages M] ...
+              [--phases discovery,parse,highlight,render,build] [--repeat R]
+              [--output results.json] [--compare baseline.json]
+
+    The phases are:
+
+    discovery
+        crawling the workspace with an empty index, reading only the
+        package names from ``package.xml``
+    parse
+        ``ROSTypeFile.parse`` of all message files, already read
+    highlight
+        highlighting all message files, already read, as HTML
+    render
+        reading all documents, that is running all the directives
+    build
+        a whole ``sphinx-build -E -b text`` in a subprocess
+
+    With ``--compare``, a phase slower than the baseline by more than the
+    tolerance is reported and the exit status is 1.
+"""
+from __future__ import print_function
+
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import workspace  # noqa
+
+PHASES = ('discovery', 'parse', 'highlight', 'render', 'build')
+
+
+def get_peak_rss():
+    u"""Return the peak RSS in KiB of this process and its children
+    """
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    if sys.platform == 'darwin':
+        peak //= 1024  # bytes on macOS
+    return peak
+
+
+def measure(func, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        start = time.time()
+        func(*args)
+        times.append(time.time() - start)
+    return times
+
+
+def run_discovery(src_dir, doc_dir, repeat):
+    from sphinxcontrib.ros.index import PackageIndex
+
+    def discover():
+        return PackageIndex().crawl(src_dir)
+    return measure(discover, repeat)
+
+
+def read_messages(src_dir):
+    u"""Return the package names and the contents of all message files
+    """
+    from sphinxcontrib.ros.message import ROSMessageBase
+    type_file = ROSMessageBase.type_file
+    contents = []
+    for package_dir in sorted(os.listdir(src_dir)):
+        for path in sorted(glob.glob(os.path.join(src_dir, package_dir,
+                                                  'msg', '*.msg'))):
+            type_name = os.path.splitext(os.path.basename(path))[0]
+            contents.append(
+                (package_dir,
+                 type_file.read(os.path.join(src_dir, package_dir),
+                                type_name)[1]))
+    return contents
+
+
+def run_parse(src_dir, doc_dir, repeat):
+    from sphinxcontrib.ros.message import ROSMessageBase
+    type_file = ROSMessageBase.type_file
+    contents = read_messages(src_dir)
+
+    def parse():
+        for package_name, content in contents:
+            type_file.parse(content, package_name)
+    return measure(parse, repeat)
+
+
+def run_highlight(src_dir, doc_dir, repeat):
+    from pygments import highlight
+    from pygments.formatters import HtmlFormatter
+    from sphinxcontrib.ros.lexer import ROSTypeLexer
+    lexer = ROSTypeLexer()
+    formatter = HtmlFormatter()
+    texts = [u'\n'.join(content) + u'\n'
+             for _, content in read_messages(src_dir)]
+
+    def highlight_all():
+        for text in texts:
+            highlight(text, lexer, formatter)
+    return measure(highlight_all, repeat)
+
+
+def run_render(src_dir, doc_dir, repeat):
+    from sphinx.application import Sphinx
+
+    def setup():
+        build_dir = tempfile.mkdtemp()
+        app = Sphinx(doc_dir, doc_dir, os.path.join(build_dir, 'text'),
+                     os.path.join(build_dir, 'doctrees'), 'text',
+                     status=None, freshenv=True)
+        return app, build_dir
+
+    def render(app, build_dir):
+        try:
+            app.env.update(app.config, app.srcdir, app.doctreedir, app)
+        finally:
+            shutil.rmtree(build_dir)
+    return measure(render, repeat, setup)
+
+
+def run_build(src_dir, doc_dir, repeat):
+    build_dir = tempfile.mkdtemp()
+    command = [sys.executable, '-m', 'sphinx', '-q', '-E', '-b', 'text',
+               doc_dir, os.path.join(build_dir, 'text')]
+    try:
+        return measure(lambda: subprocess.check_call(command), repeat)
+    finally:
+        shutil.rmtree(build_dir)
+
+
+def run_phase(phase, src_dir, doc_dir, repeat):
+    u"""Run a phase in this process and print the result as JSON
+    """
+    times = globals()['run_' + phase](src_dir, doc_dir, repeat)
+    json.dump({'times': times, 'peak_rss_kb': get_peak_rss()}, sys.stdout)
+
+
+def run_suite(args):
+    params = workspace.get_params(args)
+    work_dir = args.work_dir or tempfile.mkdtemp()
+    try:
+        src_dir, doc_dir = workspace.generate_workspace(work_dir, **params)
+        results = {}
+        for phase in args.phases.split(','):
+            output = subprocess.check_output(
+                [sys.executable, __file__, '--run-phase', phase,
+                 '--repeat', str(args.repeat), '--work-dir', work_dir])
+            result = json.loads(output.decode('utf-8').splitlines()[-1])
+            results[phase] = {'best': min(result['times']),
+                              'times': result['times'],
+                              'peak_rss_kb': result['peak_rss_kb']}
+            print('{0:<10} best {1:8.3f} s, peak RSS {2:8d} KiB'.format(
+                phase, results[phase]['best'], result['peak_rss_kb']),
+                file=sys.stderr)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir)
+    return {'workspace': params,
+            'repeat': args.repeat,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results}
+
+
+def compare(report, baseline, tolerance):
+    u"""Return the phases slower than the baseline beyond the tolerance
+    """
+    regressions = []
+    if report['workspace'] != baseline['workspace']:
+        print('warning: the workspaces of the baseline differ',
+              file=sys.stderr)
+    for phase, result in sorted(report['results'].items()):
+        if phase not in baseline['results']:
+            continue
+        ratio = result['best'] / baseline['results'][phase]['best']
+        print('{0:<10} {1:6.2f}x of the baseline'.format(phase, ratio),
+              file=sys.stderr)
+        if ratio > 1 + tolerance:
+            regressions.append(phase)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1]
+                                     .strip())
+    workspace.add_arguments(parser)
+    parser.add_argument('--phases', default=','.join(PHASES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--work-dir',
+                        help='where to generate the workspace and keep it')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--compare', help='JSON results of the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed slowdown against the baseline')
+    parser.add_argument('--run-phase', choices=PHASES,
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run_phase:
+        run_phase(args.run_phase, os.path.join(args.work_dir, 'src'),
+                  os.path.join(args.work_dir, 'doc'), args.repeat)
+        return 0
+    report = run_suite(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print('regressions: ' + ', '.join(regressions), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
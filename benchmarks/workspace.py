@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+u"""
+    Synthetic ROS workspace generator
+
+    Generates a workspace of packages with message files and a document
+    project using the auto directives on all of them::
+
+        $ python benchmarks/workspace.py <output directory>
+              [--packages N] [--messages M] [--constants C]
+              [--comment-density D] [--seed S]
+
+    The packages are written to ``<output>/src`` and the documents to
+    ``<output>/doc``. Messages refer to messages of the previous package,
+    so that the auto directives have dependencies to follow.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import shutil
+
+PACKAGE_XML = u"""<?xml version="1.0"?>
+<package>
+  <name>{name}</name>
+  <version>0.1.0</version>
+  <description>The generated package {name}</description>
+  <maintainer email="bench@example.com">Bench Mark</maintainer>
+  <license>BSD</license>
+  <buildtool_depend>catkin</buildtool_depend>
+{depends}</package>
+"""
+
+CONF_PY = u"""import os, sys
+sys.path.insert(0, {src!r})
+master_doc = 'index'
+extensions = ['sphinxcontrib.ros']
+ros_base_path = ['../src']
+"""
+
+FIELD_TYPES = ('bool', 'int32', 'uint8', 'float64', 'string', 'time',
+               'float32[]', 'uint8[16]')
+
+DEFAULTS = {
+    'packages': 20,
+    'messages': 20,
+    'constants': 5,
+    'comment_density': 0.5,
+    'seed': 0,
+}
+
+
+def package_name(index):
+    return 'bench_pkg_{0:03d}'.format(index)
+
+
+def message_name(index):
+    return 'Message{0:03d}'.format(index)
+
+
+def generate_message(rng, package_index, message_index, params):
+    u"""Return the lines of a message file
+
+    ``comment_density`` is the probability that a field or a constant has
+    comments above and on its right.
+    """
+    density = params['comment_density']
+
+    def comment(text):
+        if rng.random() < density:
+            lines.append(u'# ' + text)
+
+    def trailing(text):
+        return u'  # ' + text if rng.random() < density else u''
+
+    title = u'# Generated message {0} of {1}'.format(
+        message_name(message_index), package_name(package_index))
+    lines = [title,
+             u'#',
+             u'# It is used to benchmark the auto directives.',
+             u'']
+    for i in range(params['constants']):
+        comment(u'constant {0}'.format(i))
+        lines.append(u'uint8 CONSTANT_{0}={0}{1}'.format(
+            i, trailing(u'value {0}'.format(i))))
+    if params['constants']:
+        lines.append(u'')
+    comment(u'the header')
+    lines.append(u'Header header')
+    for i, field_type in enumerate(FIELD_TYPES):
+        comment(u'the field {0}'.format(i))
+        lines.append(u'{0} field_{1}{2}'.format(
+            field_type, i, trailing(u'field {0}'.format(i))))
+    if package_index > 0:
+        comment(u'a message of the previous package')
+        lines.append(u'{0}/{1}[] children'.format(
+            package_name(package_index - 1), message_name(message_index)))
+    if message_index > 0:
+        comment(u'a message of the same package')
+        lines.append(u'{0} sibling'.format(message_name(message_index - 1)))
+    return lines
+
+
+def write(path, text):
+    dirname = os.path.dirname(path)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    with open(path, 'wb') as f:
+        f.write(text.encode('utf-8'))
+
+
+def generate_workspace(output, **params):
+    u"""Generate a workspace under the output directory
+
+    Returns the paths of the package directory and the document directory.
+    """
+    for key, value in DEFAULTS.items():
+        params.setdefault(key, value)
+    rng = random.Random(params['seed'])
+    src_dir = os.path.join(output, 'src')
+    doc_dir = os.path.join(output, 'doc')
+    for path in (src_dir, doc_dir):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+    toctree = []
+    for i in range(params['packages']):
+        name = package_name(i)
+        depends = u''
+        if i > 0:
+            depends = u'  <build_depend>{0}</build_depend>\n'.format(
+                package_name(i - 1))
+        write(os.path.join(src_dir, name, 'package.xml'),
+              PACKAGE_XML.format(name=name, depends=depends))
+        for j in range(params['messages']):
+            write(os.path.join(src_dir, name, 'msg',
+                               message_name(j) + '.msg'),
+                  u'\n'.join(generate_message(rng, i, j, params)) + u'\n')
+        write(os.path.join(doc_dir, name + '.rst'),
+              u'\n'.join([name, u'=' * len(name), u'',
+                          u'.. ros:autopackage:: ' + name, u'',
+                          u'.. ros:automessage:: ' + name + u'/*',
+                          u'   :description: quote',
+                          u'   :field-comment: up',
+                          u'']))
+        toctree.append(u'   ' + name)
+    src = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                       '..', 'src'))
+    write(os.path.join(doc_dir, 'conf.py'), CONF_PY.format(src=src))
+    write(os.path.join(doc_dir, 'index.rst'),
+          u'\n'.join([u'Workspace', u'=========', u'',
+                      u'.. toctree::', u''] + toctree + [u'']))
+    return src_dir, doc_dir
+
+
+def add_arguments(parser):
+    parser.add_argument('--packages', type=int,
+                        default=DEFAULTS['packages'])
+    parser.add_argument('--messages', type=int,
+                        default=DEFAULTS['messages'],
+                        help='messages per package')
+    parser.add_argument('--constants', type=int,
+                        default=DEFAULTS['constants'],
+                        help='constants per message')
+    parser.add_argument('--comment-density', type=float,
+                        default=DEFAULTS['comment_density'],
+                        help='probability of a field to have comments')
+    parser.add_argument('--seed', type=int, default=DEFAULTS['seed'])
+
+
+def get_params(args):
+    return {key: getattr(args, key) for key in DEFAULTS}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1]
+                                     .strip())
+    parser.add_argument('output')
+    add_arguments(parser)
+    args = parser.parse_args()
+    src_dir, doc_dir = generate_workspace(args.output, **get_params(args))
+    print('packages: {0}\ndocuments: {1}'.format(src_dir, doc_dir))
@@ -41,4 +41,9 @@ setup(
     install_requires=install_requires,
     tests_require=test_require,
     namespace_packages=['sphinxcontrib'],
+    entry_points={
+        'console_scripts': [
+            'sphinx-ros-index = sphinxcontrib.ros.snapshot:main',
+        ],
+    },
 )
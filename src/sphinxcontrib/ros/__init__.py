@@ -9,6 +9,10 @@ u"""
 """
 from __future__ import print_function
 
+import copy
+
+from docutils import nodes
+from sphinx import addnodes
 from sphinx.domains import Domain, ObjType
 from sphinx.locale import l_
 from sphinx.roles import XRefRole
@@ -16,8 +20,15 @@ from sphinx.util.nodes import make_refnode
 
 from .package import ROSPackage, ROSAutoPackage, add_formatter
 from .message import (ROSMessage, ROSAutoMessage, ROSService,
-                      ROSAutoService, ROSAction, ROSAutoAction, ROSTypeLexer)
+                      ROSAutoService, ROSAction, ROSAutoAction,
+                      clear_type_graph)
 from .api import ROSAPI
+from .base import (ROSObjectDescription, init_package_index,
+                   build_package_index, merge_package_index,
+                   save_package_index, get_outdated_docs)
+from .profiling import clear_profile, write_profile
+from .highlighting import install_highlight_cache, save_highlight_cache
+from .inventory import ExternalObjects, find_candidates, get_short_names
 
 
 class ROSDomain(Domain):
@@ -52,41 +63,182 @@ class ROSDomain(Domain):
         'node':  XRefRole(),
     }
     initial_data = {
-        'objects': {}  # (objtype, name) -> docname
+        'objects': {},  # (objtype, name) -> docname
+        'docobjects': {},  # docname -> set of (objtype, name)
+        'interfaces': {},  # (type file, content hash) -> parsed fields
+        'interface_keys': {},  # docname -> set of keys of 'interfaces'
+        # keys of the type files involved -> (md5sum, full definition)
+        'definitions': {},
+        'crawled': {},  # base path -> exported package index, while reading
+        'manifests': {},  # package index entries parsed fully, while reading
+        'dependencies': {},  # docname -> {package or type file: state}
+        'profile': {},  # docname -> statistics, if ros_profile is enabled
     }
+    data_version = 8
 
     def clear_doc(self, docname):
-        for fullname, fn in list(self.data['objects'].items()):
-            if fn == docname:
-                del self.data['objects'][fullname]
+        self.clear_xref_index()
+        objects = self.data['objects']
+        for fullname in self.data['docobjects'].pop(docname, ()):
+            # the object may have been taken over by another document
+            if objects.get(fullname) == docname:
+                del objects[fullname]
+        self.data['interface_keys'].pop(docname, None)
+        self.data['dependencies'].pop(docname, None)
+        self.data['profile'].pop(docname, None)
 
     def merge_domaindata(self, docnames, otherdata):
-        for fullname, docname in otherdata['objects'].items():
-            if docname in docnames:
-                self.data['objects'][fullname] = docname
+        self.clear_xref_index()
+        for docname in docnames:
+            fullnames = otherdata['docobjects'].get(docname)
+            if fullnames:
+                self.data['docobjects'][docname] = fullnames
+                for fullname in fullnames:
+                    self.data['objects'][fullname] = docname
+            if docname in otherdata['dependencies']:
+                self.data['dependencies'][docname] \
+                    = otherdata['dependencies'][docname]
+            if docname in otherdata['profile']:
+                self.data['profile'][docname] = otherdata['profile'][docname]
+            keys = otherdata['interface_keys'].get(docname)
+            if keys:
+                self.data['interface_keys'][docname] = keys
+                for key in keys:
+                    self.data['interfaces'][key] \
+                        = otherdata['interfaces'][key]
+        self.data['definitions'].update(otherdata['definitions'])
+        merge_package_index(otherdata['crawled'], otherdata['manifests'])
+
+    def prune_interfaces(self):
+        u"""Drop parsed interfaces no longer used by any document
+        """
+        used_keys = set()
+        for keys in self.data['interface_keys'].values():
+            used_keys.update(keys)
+        for key in list(self.data['interfaces']):
+            if key not in used_keys:
+                del self.data['interfaces'][key]
+        for keys in list(self.data['definitions']):
+            if not used_keys.issuperset(keys):
+                del self.data['definitions'][keys]
+
+    def __init__(self, env):
+        if self.name not in env.domaindata:
+            # do not share the containers of initial_data between the
+            # environments of the applications in the same process
+            data = copy.deepcopy(self.initial_data)
+            init_storage(env, data, True)
+            data['version'] = self.data_version
+            env.domaindata[self.name] = data
+        elif not init_storage(env, env.domaindata[self.name], False):
+            # let Sphinx make a new environment like for a new data_version
+            raise IOError('data of %r domain out of date' % self.label)
+        Domain.__init__(self, env)
+        self.clear_xref_index()
+        self._external = None
+
+    def clear_xref_index(self):
+        self._short_names = None  # short name -> sorted [(objtype, name)]
+        self._unresolved = set()  # (objtypes, target, package)
+
+    def short_names(self):
+        if self._short_names is None:
+            objects = self.data['objects']
+            if isinstance(objects, dict):
+                self._short_names = get_short_names(objects)
+            else:
+                # looked up in the storage, without loading all the objects
+                from .storage import ShortNames
+                self._short_names = ShortNames(objects)
+        return self._short_names
+
+    def process_doc(self, env, docname, document):
+        self.clear_xref_index()
+
+    def get_external_objects(self, env):
+        u"""Return the ROS objects of the intersphinx inventories
+        """
+        inventory = getattr(env, 'intersphinx_inventory', None)
+        if not inventory:
+            return None
+        # intersphinx replaces the inventory when it loads it again
+        if self._external is None or self._external.inventory is not inventory:
+            self._external = ExternalObjects(inventory, self.object_types)
+        return self._external
+
+    def pick_candidate(self, env, fromdocname, target, node, candidates):
+        if len(candidates) > 1:
+            env.warn(fromdocname,
+                     'more than one target found for cross-reference %r: %s' %
+                     (target, ', '.join(name for _, name in candidates)),
+                     node.line)
+        return candidates[0]
+
+    def find_object(self, env, fromdocname, objtypes, target, node):
+        u"""Find the object by qualified, package-relative or short name
+
+        Returns ``(objtype, name)`` or None.
+        """
+        package = node.get('ros:package')
+        key = (tuple(objtypes), target, package)
+        if key in self._unresolved:
+            return None
+        candidates = find_candidates(self.data['objects'], self.short_names,
+                                     objtypes, target, package)
+        if not candidates:
+            self._unresolved.add(key)
+            return None
+        return self.pick_candidate(env, fromdocname, target, node, candidates)
+
+    def find_external_object(self, env, fromdocname, objtypes, target, node):
+        u"""Find the object in the intersphinx inventories like find_object
+        """
+        external = self.get_external_objects(env)
+        if external is None:
+            return None
+        candidates = external.find_candidates(objtypes, target,
+                                              node.get('ros:package'))
+        if not candidates:
+            return None
+        return self.pick_candidate(env, fromdocname, target, node, candidates)
 
     def resolve_xref(self, env, fromdocname, builder, typ, target, node,
                      contnode):
-        objects = self.data['objects']
         objtypes = self.objtypes_for_role(typ)
-        for objtype in objtypes:
-            if (objtype, target) in objects:
-                return make_refnode(builder, fromdocname,
-                                    objects[objtype, target],
-                                    objtype + '-' + target,
-                                    contnode, target)
+        fullname = self.find_object(env, fromdocname, objtypes, target, node)
+        if fullname:
+            objtype, name = fullname
+            return make_refnode(builder, fromdocname,
+                                self.data['objects'][fullname],
+                                objtype + '-' + name,
+                                contnode, name)
+        fullname = self.find_external_object(env, fromdocname, objtypes,
+                                             target, node)
+        if fullname:
+            return self._external.make_refnode(env, fromdocname, fullname,
+                                               contnode)
 
     def resolve_any_xref(self, env, fromdocname, builder, target, node,
                          contnode):
-        objects = self.data['objects']
         results = []
-        for objtype in self.object_types:
-            if (objtype, target) in self.data['objects']:
-                results.append(('ros:' + self.role_for_objtype(objtype),
-                                make_refnode(builder, fromdocname,
-                                             objects[objtype, target],
-                                             objtype + '-' + target,
-                                             contnode, target)))
+        for objtype in sorted(self.object_types):
+            fullname = self.find_object(env, fromdocname, [objtype],
+                                        target, node)
+            if fullname:
+                name = fullname[1]
+                refnode = make_refnode(builder, fromdocname,
+                                       self.data['objects'][fullname],
+                                       objtype + '-' + name,
+                                       contnode, name)
+            else:
+                fullname = self.find_external_object(env, fromdocname,
+                                                     [objtype], target, node)
+                if not fullname:
+                    continue
+                refnode = self._external.make_refnode(env, fromdocname,
+                                                      fullname, contnode)
+            results.append(('ros:' + self.role_for_objtype(objtype),
+                            refnode))
         return results
 
     def get_objects(self):
@@ -94,6 +246,76 @@ class ROSDomain(Domain):
             yield name, name, typ, docname, typ + '-' + name, 1
 
 
+def prune_interfaces(app, env):
+    env.domains['ros'].prune_interfaces()
+
+
+def load_snapshot(app):
+    u"""Load the snapshot given by ros_index_snapshot, if any
+    """
+    ROSObjectDescription._snapshot = None
+    if app.config.ros_index_snapshot:
+        from .snapshot import load_snapshot
+        load_snapshot(app, app.config.ros_index_snapshot)
+
+
+def in_storage(env, data):
+    u"""Return True if the domain data is, or should be, in a storage
+
+    The storage module is imported only then.
+    """
+    return env.config.ros_storage is not None or \
+        not isinstance(data.get('objects'), dict)
+
+
+def init_storage(env, data, new):
+    if not in_storage(env, data):
+        return True
+    from .storage import init_storage
+    return init_storage(env, data, new)
+
+
+def switch_storage(app, env, docnames):
+    if in_storage(env, env.domaindata['ros']):
+        from .storage import switch_storage
+        switch_storage(app, env, docnames)
+
+
+def flush_storage(app, doctree):
+    if in_storage(app.env, app.env.domaindata['ros']):
+        from .storage import flush_storage
+        flush_storage(app, doctree)
+
+
+def commit_storage(app, env):
+    if in_storage(env, env.domaindata['ros']):
+        from .storage import commit_storage
+        commit_storage(app, env)
+
+
+def add_rostype_lexer(app):
+    from sphinx.highlighting import lexers
+    if 'rostype' not in lexers:
+        from .lexer import ROSTypeLexer
+        app.add_lexer('rostype', ROSTypeLexer())
+
+
+def init_rostype_lexer(app):
+    if app.config.highlight_language == 'rostype':
+        add_rostype_lexer(app)
+
+
+def register_rostype_lexer(app, doctree, docname):
+    u"""Register the lexer when the first document using it is written
+    """
+    for node in doctree.traverse(nodes.literal_block):
+        if node.get('language') == 'rostype':
+            return add_rostype_lexer(app)
+    for node in doctree.traverse(addnodes.highlightlang):
+        if node['lang'] == 'rostype':
+            return add_rostype_lexer(app)
+
+
 def setup(app):
     u"""
     setup
@@ -118,8 +340,31 @@ def setup(app):
     ], True)
     app.add_config_value('ros_package_attrs_formatter', {}, True)
     app.add_config_value('ros_base_path', [], True)
+    app.add_config_value('ros_exclude_patterns', [], True)
+    app.add_config_value('ros_prefix_path', [], True)
+    app.add_config_value('ros_package_path', [], True)
+    app.add_config_value('ros_use_env_package_path', False, True)
+    app.add_config_value('ros_index_snapshot', None, True)
+    app.add_config_value('ros_profile', False, 'env')
+    app.add_config_value('ros_build_nodes', True, 'env')
+    app.add_config_value('ros_storage', None, 'env')
     app.add_domain(ROSDomain)
-    app.add_lexer("rostype", ROSTypeLexer())
+    app.connect('builder-inited', init_package_index)
+    app.connect('builder-inited', load_snapshot)
+    app.connect('builder-inited', clear_type_graph)
+    app.connect('builder-inited', clear_profile)
+    app.connect('builder-inited', init_rostype_lexer)
+    app.connect('builder-inited', install_highlight_cache)
+    app.connect('doctree-resolved', register_rostype_lexer)
+    app.connect('env-get-outdated', get_outdated_docs)
+    app.connect('env-before-read-docs', build_package_index)
+    app.connect('env-before-read-docs', switch_storage)
+    app.connect('env-updated', save_package_index)
+    app.connect('env-updated', prune_interfaces)
+    app.connect('env-updated', commit_storage)
+    app.connect('doctree-read', flush_storage)
+    app.connect('build-finished', write_profile)
+    app.connect('build-finished', save_highlight_cache)
     return {'version': '0.1.0', 'parallel_read_safe': True}
 
 __all__ = [
@@ -10,13 +10,24 @@ u"""
 """
 from __future__ import print_function
 
+import os
+import re
+import time
+from contextlib import contextmanager
+
 from docutils import nodes
+from docutils.statemachine import StringList
 from sphinx import addnodes
 from sphinx.directives import ObjectDescription
 from sphinx.locale import _
-from sphinx.util.docfields import Field
+from sphinx.util.docfields import Field, DocFieldTransformer
+
+from .index import PackageIndex, INDEX_FILENAME
+from .profiling import new_stats
 
-from catkin_pkg.packages import find_packages
+# a line parsed as a paragraph, without any block level construct
+PARAGRAPH_LINE_RE = re.compile(r'[^\W_]', re.UNICODE)
+ENUMERATOR_RE = re.compile(r'(\d+|[a-zA-Z]|[ivxlcdmIVXLCDM]+)[.)](\s|$)')
 
 
 class GroupedFieldNoArg(Field):
@@ -37,33 +48,410 @@ class GroupedFieldNoArg(Field):
         return nodes.field('', fieldname, fieldbody)
 
 
+def init_package_index(app):
+    u"""Load the package index and forget the crawls of the last build
+    """
+    index_filename = os.path.join(app.doctreedir, INDEX_FILENAME)
+    index = ROSObjectDescription._package_index
+    if index is None or index.filename != index_filename:
+        ROSObjectDescription._package_index = PackageIndex(index_filename)
+    else:
+        index.crawled.clear()
+        index.installed.clear()
+    ROSObjectDescription._package_index.exclude_patterns \
+        = tuple(app.config.ros_exclude_patterns)
+    ROSObjectDescription._ros_packages = {}
+    ROSObjectDescription._ros_lookups = {}
+
+
+def resolve_paths(env, paths):
+    u"""Return the absolute paths, without empty and repeated ones
+    """
+    abspaths = []
+    for path in paths:
+        if path:
+            path = os.path.normpath(os.path.join(env.srcdir, path))
+            if path not in abspaths:
+                abspaths.append(path)
+    return abspaths
+
+
+def get_base_paths(env):
+    u"""Return the absolute ros_base_path, the last one first
+    """
+    return resolve_paths(env, reversed(env.config.ros_base_path or ['.']))
+
+
+def get_package_paths(env):
+    u"""Return the paths searched for packages in order of precedence
+
+    They are ros_base_path, the last one first, ros_package_path and, if
+    ros_use_env_package_path is set, ROS_PACKAGE_PATH.
+    """
+    package_path = list(env.config.ros_package_path or ())
+    if env.config.ros_use_env_package_path:
+        package_path.extend(
+            os.environ.get('ROS_PACKAGE_PATH', '').split(os.pathsep))
+    return resolve_paths(env, get_base_paths(env) + package_path)
+
+
+def find_ros_packages(env, paths=None):
+    u"""Return a dict mapping names to packages under the package paths
+
+    The paths, all the package paths by default, not crawled yet are
+    crawled concurrently. A package found in several paths is taken from
+    the one of the highest precedence.
+    """
+    index = ROSObjectDescription._package_index
+    if paths is None:
+        paths = get_package_paths(env)
+    base_abspaths = list(reversed(paths))
+    uncrawled = [base_abspath for base_abspath in base_abspaths
+                 if base_abspath not in index.crawled]
+    index.find_all_packages(base_abspaths)
+    packages = {}
+    for base_abspath in base_abspaths:
+        packages.update(index.find_packages(base_abspath))
+    # hand the crawls over to the main process via merge_domaindata
+    for base_abspath in uncrawled:
+        env.domaindata['ros']['crawled'][base_abspath] \
+            = index.export(base_abspath)
+    return packages
+
+
+def find_ros_package(env, name):
+    u"""Find the package (see find_package_in_paths)
+
+    The result, even if not found, is remembered for the build.
+    """
+    lookups = ROSObjectDescription._ros_lookups
+    if name in lookups:
+        return lookups[name]
+    index = ROSObjectDescription._package_index
+    package = find_package_in_paths(env, index, name)
+    lookups[name] = package
+    return package
+
+
+def find_package_in_paths(env, index, name):
+    u"""Find the package in ros_base_path, in ros_index_snapshot, under
+    ros_prefix_path, then in the other package paths
+
+    The packages of the project thus overlay the installed ones and
+    those of the snapshot, which may be older than the project.
+    """
+    base_paths = get_base_paths(env)
+    package = search_package_paths(env, index, base_paths, name)
+    if package:
+        return package
+    snapshot = ROSObjectDescription._snapshot
+    if snapshot is not None and name in snapshot.packages:
+        return snapshot.packages[name]
+    for prefix in env.config.ros_prefix_path:
+        package = index.find_installed(
+            os.path.normpath(os.path.join(env.srcdir, prefix)), name)
+        if package:
+            return package
+    return search_package_paths(env, index,
+                                get_package_paths(env)[len(base_paths):],
+                                name)
+
+
+def search_package_paths(env, index, paths, name):
+    u"""Find the package in the paths or return None
+
+    ``<path>/<name>/package.xml`` is probed in each path before crawling
+    them all, which is needed only when the directory of the package is
+    not named after it.
+    """
+    for path in paths:
+        package = index.probe(path, name)
+        if package:
+            return package
+    if not paths:
+        return None
+    return find_ros_packages(env, paths).get(name, None)
+
+
+def build_package_index(app, env, docnames):
+    u"""Look up the packages of the documents to read in parallel
+
+    Parallel readers are forked after this event, so they inherit the
+    lookups, and the crawl if a probe misses, instead of crawling the
+    package paths each. The packages looked up by a document in the last
+    build are looked up again, and the paths are crawled for a document
+    not read yet, which may look up any package.
+    """
+    if app.parallel <= 1:
+        return
+    dependencies = env.domaindata['ros']['dependencies']
+    for docname in docnames:
+        if docname not in env.all_docs:
+            if not ROSObjectDescription._ros_packages:
+                # the snapshot stands for the other package paths
+                paths = get_base_paths(env) \
+                    if ROSObjectDescription._snapshot is not None else None
+                ROSObjectDescription._ros_packages \
+                    = find_ros_packages(env, paths)
+            continue
+        for key in dependencies.get(docname, ()):
+            if key[0] == 'package' and key[1] is None:
+                find_ros_package(env, key[2])
+
+
+def merge_package_index(crawled, manifests):
+    u"""Merge the crawls and the manifests parsed in a parallel reader
+    """
+    index = ROSObjectDescription._package_index
+    for base_abspath, exported in crawled.items():
+        index.merge(base_abspath, exported)
+    index.merge_entries(manifests)
+
+
+def get_file_state(filename):
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return (stat.st_mtime, stat.st_size)
+
+
+def get_dependency_state(env, key):
+    u"""Return the current state of a dependency noted by a directive
+    """
+    if key[0] == 'package':
+        base_abspath, name = key[1:]
+        if base_abspath is None:
+            package = find_ros_package(env, name)
+        else:
+            index = ROSObjectDescription._package_index
+            package = index.find_packages(base_abspath).get(name, None)
+        return package.filename if package else None
+    else:
+        return get_file_state(key[1])
+
+
+def get_outdated_docs(app, env, added, changed, removed):
+    u"""Find documents whose packages or type files have changed
+
+    A package which appeared, disappeared or moved under the base paths,
+    and a type file which changed or disappeared, outdate exactly the
+    documents depending on them.
+    """
+    states = {}
+    outdated = []
+    for docname, dependencies in env.domaindata['ros']['dependencies'].items():
+        if docname in changed or docname in removed:
+            continue
+        for key, state in dependencies.items():
+            if key not in states:
+                states[key] = get_dependency_state(env, key)
+            if states[key] != state:
+                outdated.append(docname)
+                break
+    return outdated
+
+
+def save_package_index(app, env):
+    u"""Write the package index back to the doctree directory
+    """
+    index = ROSObjectDescription._package_index
+    if index is not None:
+        index.save()
+    env.domaindata['ros']['crawled'].clear()
+    env.domaindata['ros']['manifests'].clear()
+
+
+def make_code_block(lines, language, source=None, line=None):
+    u"""Make the literal block the code-block directive makes of the lines
+    """
+    spaces = [len(l) - len(l.lstrip()) for l in lines if l.strip()]
+    min_spaces = min(spaces) if spaces else 0
+    lines = [l[min_spaces:] for l in lines]
+    while lines and not lines[0].strip():
+        del lines[0]
+    while lines and not lines[-1].strip():
+        del lines[-1]
+    code = u'\n'.join(lines)
+    literal = nodes.literal_block(code, code)
+    literal['language'] = language
+    literal['linenos'] = False
+    literal['highlight_args'] = {}
+    literal.source, literal.line = source, line
+    return literal
+
+
+class DocFieldBuilder(object):
+    u"""Build the field list DocFieldTransformer makes of doc fields
+
+    The fields are added with their parsed bodies instead of being written
+    as rST text, parsed and transformed. The entries are grouped and made
+    into fields by the doc field types of the directive like
+    :meth:`DocFieldTransformer.transform` does.
+    """
+    def __init__(self, directive):
+        self.domain = directive.domain
+        self.typemap = DocFieldTransformer(directive).typemap
+        self.entries = []
+        self.groupindices = {}
+        self.types = {}
+
+    def add_field(self, fieldtype, fieldarg, fieldbody, source=None,
+                  line=None):
+        typedesc, is_typefield = self.typemap.get(fieldtype, (None, None))
+        if typedesc is None or typedesc.has_arg != bool(fieldarg):
+            # unknown field, capitalize its name like DocFieldTransformer
+            fieldname = fieldtype[0:1].upper() + fieldtype[1:]
+            if fieldarg:
+                fieldname += ' ' + fieldarg
+            field = nodes.field('', nodes.field_name(fieldname, fieldname),
+                                fieldbody)
+            field.source, field.line = source, line
+            self.entries.append(field)
+            return
+        typename = typedesc.name
+        # a single paragraph, with the system messages reported about it
+        if len(fieldbody) and isinstance(fieldbody[0], nodes.paragraph) and \
+           all(isinstance(child, nodes.system_message)
+               for child in fieldbody[1:]):
+            content = fieldbody[0].children
+        else:
+            content = fieldbody.children
+        if is_typefield:
+            content = [n for n in content
+                       if isinstance(n, (nodes.Inline, nodes.Text))]
+            if content:
+                self.types.setdefault(typename, {})[fieldarg] = content
+            return
+        translatable_content = nodes.inline(fieldbody.rawsource,
+                                            translatable=True)
+        translatable_content.source = source
+        translatable_content.line = line
+        translatable_content += content
+        entry = typedesc.make_entry(fieldarg, [translatable_content])
+        if typedesc.is_grouped:
+            if typename in self.groupindices:
+                group = self.entries[self.groupindices[typename]]
+            else:
+                self.groupindices[typename] = len(self.entries)
+                group = [typedesc, []]
+                self.entries.append(group)
+            group[1].append(entry)
+        else:
+            self.entries.append([typedesc, entry])
+
+    def make_field_list(self):
+        u"""Return the field list, or None if no field has been added
+        """
+        if not self.entries:
+            return None
+        field_list = nodes.field_list()
+        for entry in self.entries:
+            if isinstance(entry, nodes.field):
+                field_list += entry
+            else:
+                fieldtype, content = entry
+                fieldtypes = self.types.get(fieldtype.name, {})
+                field_list += fieldtype.make_field(fieldtypes, self.domain,
+                                                   content)
+        return field_list
+
+
 class ROSObjectDescription(ObjectDescription):
     u"""ROS Object"""
     _ros_packages = {}
+    _ros_lookups = {}  # name -> package or None, kept per build
+    _package_index = None
+    _snapshot = None  # Snapshot given by ros_index_snapshot
     doc_merge_fields = {}
+    # nodes put before and after the parsed content by update_content
+    head_nodes = ()
+    tail_nodes = ()
 
-    def find_package(self, name):
+    def note_ros_dependency(self, key, state):
+        dependencies = self.env.domaindata['ros']['dependencies']
+        dependencies.setdefault(self.env.docname, {})[key] = state
+
+    def get_profile(self):
+        u"""Return the statistics of the document if profiling is enabled
+        """
+        if not self.env.config.ros_profile:
+            return None
+        profile = self.env.domaindata['ros']['profile']
+        return profile.setdefault(self.env.docname, new_stats())
+
+    @contextmanager
+    def profile(self, phase):
+        u"""Add the time spent in the block to the phase
+        """
+        stats = self.get_profile()
+        if stats is None:
+            yield
+            return
+        start = time.time()
+        try:
+            yield
+        finally:
+            phases = stats['phases']
+            phases[phase] = phases.get(phase, 0.0) + time.time() - start
+
+    def count_cache(self, cache, hit):
+        stats = self.get_profile()
+        if stats is not None:
+            counts = stats['caches'].setdefault(cache, [0, 0])
+            counts[0 if hit else 1] += 1
+
+    def get_base_abspath(self):
+        u"""Return the absolute path of the base option or None
+        """
         if 'base' in self.options and self.options['base'] is not None:
-            base_abspath = self.env.relfn2path(self.options['base'])[1]
-            packages = find_packages(base_abspath)
-            package = next((package for package in packages.values()
-                            if package.name == name), None)
+            return self.env.relfn2path(self.options['base'])[1]
+        return None
+
+    def lookup_package(self, name):
+        u"""Find the package and note it as a dependency of the document
+        """
+        with self.profile('find_package'):
+            return self._lookup_package(name)
+
+    def _lookup_package(self, name):
+        index = ROSObjectDescription._package_index
+        base_abspath = self.get_base_abspath()
+        if base_abspath is not None:
+            crawled = base_abspath in index.crawled
+            self.count_cache('packages', crawled)
+            package = index.find_packages(base_abspath).get(name, None)
+            if not crawled:
+                # hand the crawl over to the main process via merge_domaindata
+                self.env.domaindata['ros']['crawled'][base_abspath] \
+                    = index.export(base_abspath)
         else:
-            if not ROSObjectDescription._ros_packages:
-                packages = {}
-                base_paths = self.env.config.ros_base_path
-                if not base_paths:
-                    base_paths = ['.']
-                for base_path in base_paths:
-                    if base_path.startswith('/'):
-                        base_abspath = base_path
-                    else:
-                        base_abspath = self.env.relfn2path(base_path)[1]
-                    found_packages = find_packages(base_abspath)
-                    for package in found_packages.values():
-                        packages[package.name] = package
-                ROSObjectDescription._ros_packages = packages
-            package = ROSObjectDescription._ros_packages.get(name, None)
+            self.count_cache('packages',
+                             name in ROSObjectDescription._ros_lookups)
+            package = find_ros_package(self.env, name)
+        self.note_ros_dependency(('package', base_abspath, name),
+                                 package.filename if package else None)
+        return package
+
+    def get_manifest(self, package):
+        u"""Return the package with the whole manifest parsed
+
+        The parsed manifest is taken from the snapshot if any, or cached in
+        the package index.
+        """
+        snapshot = ROSObjectDescription._snapshot
+        if snapshot is not None and package.filename in snapshot.manifests:
+            return snapshot.manifests[package.filename]
+        index = ROSObjectDescription._package_index
+        with self.profile('parse_manifest'):
+            manifest = index.get_package(package.filename)
+        # hand the manifest over to the main process via merge_domaindata
+        self.env.domaindata['ros']['manifests'][package.filename] \
+            = index.entries[package.filename]
+        return manifest
+
+    def find_package(self, name):
+        package = self.lookup_package(name)
         if not package:
             self.state_machine.reporter.warning(
                 'cannot find package %s' % name,
@@ -83,7 +471,8 @@ class ROSObjectDescription(ObjectDescription):
             signode['ids'].append(targetname)
             signode['first'] = not self.names
             self.state.document.note_explicit_target(signode)
-            objects = self.env.domaindata['ros']['objects']
+            data = self.env.domaindata['ros']
+            objects = data['objects']
             if fullname in objects:
                 self.state_machine.reporter.warning(
                     'duplicate object description of %s, ' % name +
@@ -91,6 +480,8 @@ class ROSObjectDescription(ObjectDescription):
                     self.env.doc2path(objects[fullname]),
                     line=self.lineno)
             objects[fullname] = self.env.docname
+            data['docobjects'].setdefault(self.env.docname,
+                                          set()).add(fullname)
         indextext = _('%s (ROS %s)') % (name, self.objtype)
         self.indexnode['entries'].append(('single', indextext,
                                           targetname,
@@ -132,39 +523,123 @@ class ROSObjectDescription(ObjectDescription):
             src, srcline = self.content.info(lineno)
         return (src, srcline)
 
+    def parse_field_body(self, lines):
+        u"""Parse the lines of the body of a doc field into a field_body
+
+        A single line which can only be a paragraph is parsed as inline
+        text. Anything else is parsed as rST.
+        """
+        text = u'\n'.join(lines).strip()
+        fieldbody = nodes.field_body(text)
+        if not text:
+            return fieldbody
+        if len(lines) == 1:
+            if PARAGRAPH_LINE_RE.match(text) and \
+               not ENUMERATOR_RE.match(text) and not text.endswith('::'):
+                textnodes, messages = self.state.inline_text(text,
+                                                             self.lineno)
+                if not messages:
+                    fieldbody += nodes.paragraph(text, '', *textnodes)
+                    return fieldbody
+            lines = StringList([text], items=lines.items)
+        reporter = self.state.reporter
+        get_source_and_line = reporter.get_source_and_line
+
+        def get_body_source_and_line(lineno=None):
+            if lineno is None:
+                return (None, None)
+            # messages at the end of the body refer to its last line
+            source, offset = lines.info(min(lineno, len(lines)) - 1)
+            return (source, offset + 1)
+        reporter.get_source_and_line = get_body_source_and_line
+        try:
+            self.state.nested_parse(lines, 0, fieldbody)
+        finally:
+            reporter.get_source_and_line = get_source_and_line
+        return fieldbody
+
     def merge_field(self, src_node, dest_node):
         pass
 
     def run(self):
+        self.env = self.state.document.settings.env
+        stats = self.get_profile()
+        start = time.time()
+        node = self.run_object()
+        if stats is not None and self.names:
+            name = self.objtype + ' ' + self.names[0]
+            stats['objects'][name] \
+                = stats['objects'].get(name, 0.0) + time.time() - start
+        return node
+
+    def run_object(self):
         node = ObjectDescription.run(self)
         contentnode = node[1][-1]
+        contentnode.insert(0, list(self.head_nodes))
+        contentnode.extend(self.tail_nodes)
+        if self.names:
+            # resolve the references relative to the package of the object
+            package_name = self.names[0].split('/', 1)[0]
+            for xref in contentnode.traverse(addnodes.pending_xref):
+                if xref.get('refdomain') == 'ros':
+                    xref['ros:package'] = package_name
+        with self.profile('merge'):
+            self.merge_fields(contentnode)
+        return node
+
+    def merge_fields(self, contentnode):
+        u"""Merge the items of the fields of doc_merge_fields
+
+        Each item of a source field is merged into the items of the same
+        name of its destination field, then the source field is removed.
+        The fields and the items of the destinations are indexed once, so
+        that merging takes a time linear in the number of items.
+        """
+        if not self.doc_merge_fields:
+            return
         # label is the key to find the field-value
         labelmap = {field_type.name: unicode(field_type.label)  # name -> label
                     for field_type in self.doc_field_types}
-        field_nodes = {}
+        field_nodes = {}  # label -> field_node
         for child in contentnode:
             if isinstance(child, nodes.field_list):
                 for field in child:
                     if isinstance(field, nodes.field):
-                        # label -> field_node
                         field_nodes[field[0].astext()] = field
-        # merge
-        for field_src, field_dest in self.doc_merge_fields.items():
-            # name -> label -> field_node
-            label_src = labelmap[field_src]
-            if label_src in field_nodes:
-                field_node_src = field_nodes[label_src]
-                label_dest = labelmap[field_dest]
-                if label_dest in field_nodes:
-                    field_node_dest = field_nodes[label_dest]
-                    for item_src in field_node_src[1][0]:
-                        name = item_src[0][0].astext()
-                        for item_dest in field_node_dest[1][0]:
-                            if name == item_dest[0][0].astext():
-                                # merge first paragraph
-                                self.merge_field(item_src[0],
-                                                 item_dest[0])
-                for child in contentnode:
-                    if isinstance(child, nodes.field_list):
-                        child.remove(field_node_src)
-        return node
+        dest_items = {}  # label -> item name -> [item]
+        for field_src, field_dest in sorted(self.doc_merge_fields.items()):
+            field_node_src = field_nodes.get(labelmap[field_src])
+            if field_node_src is None:
+                continue
+            label_dest = labelmap[field_dest]
+            if label_dest in field_nodes:
+                if label_dest not in dest_items:
+                    dest_items[label_dest] = index_field_items(
+                        field_nodes[label_dest])
+                items = dest_items[label_dest]
+                for item_src in get_field_items(field_node_src):
+                    name = item_src[0][0].astext()
+                    for item_dest in items.get(name, ()):
+                        # merge first paragraph
+                        self.merge_field(item_src[0], item_dest[0])
+            field_node_src.parent.remove(field_node_src)
+
+
+def get_field_items(field_node):
+    u"""Return the items of a field, whose first child is a paragraph
+
+    A field of a single item may have been collapsed into its body.
+    """
+    content = field_node[1][0]
+    if isinstance(content, (nodes.bullet_list, nodes.enumerated_list)):
+        return content.children
+    return [field_node[1]]
+
+
+def index_field_items(field_node):
+    u"""Return a dict mapping the names to the items of a field
+    """
+    items = {}
+    for item in get_field_items(field_node):
+        items.setdefault(item[0][0].astext(), []).append(item)
+    return items
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+u"""
+    sphinxcontrib.ros.highlighting
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Cache of the highlighted rostype code blocks.
+
+    :copyright: Copyright 2015 by otamachan.
+    :license: BSD, see LICENSE for details.
+"""
+from __future__ import print_function
+
+import hashlib
+import os
+import pickle
+
+CACHE_FILENAME = 'ros_highlight.pickle'
+CACHE_VERSION = 2  # bump when the output of the lexer changes
+MAX_AGE = 5  # builds an entry may stay unused before it is dropped
+
+
+class HighlightCache(object):
+    u"""Highlighted code stored under the doctree directory
+
+    Each entry is keyed by the hash of the code and by the options of the
+    highlighter and of its formatter, and remembers the build which used
+    it last, so that the code of files no longer documented is dropped
+    after a few builds.
+    """
+    def __init__(self, filename=None):
+        self.filename = filename
+        # key -> (build, highlighted code)
+        self.entries = {}
+        self.build = 0
+        self.modified = False
+        if filename:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.filename, 'rb') as f:
+                version, build, entries = pickle.load(f)
+        except Exception:
+            # missing or broken cache, just start from scratch
+            return
+        if version == CACHE_VERSION:
+            self.build = build + 1
+            self.entries = entries
+
+    def save(self):
+        if not self.modified or not self.filename:
+            return
+        for key, (build, _) in list(self.entries.items()):
+            if build < self.build - MAX_AGE:
+                del self.entries[key]
+        dirname = os.path.dirname(self.filename)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'wb') as f:
+            pickle.dump((CACHE_VERSION, self.build, self.entries), f,
+                        pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_filename, self.filename)
+        self.modified = False
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] != self.build:
+            self.entries[key] = (self.build, entry[1])
+            self.modified = True
+        return entry[1]
+
+    def set(self, key, hlsource):
+        self.entries[key] = (self.build, hlsource)
+        self.modified = True
+
+
+def get_key(highlighter, source, lang, opts, kwargs):
+    u"""Return the cache key of a code block
+    """
+    digest = hashlib.sha1(source.encode('utf-8')).hexdigest()
+    return (digest, lang, highlighter.dest,
+            repr(highlighter.formatter),
+            repr(sorted(highlighter.formatter_args.items())),
+            repr(sorted((opts or {}).items())),
+            repr(sorted(kwargs.items())))
+
+
+def install_highlight_cache(app):
+    u"""Let the highlighter of the builder reuse the highlighted rostype code
+
+    Only the builders sharing a highlighter among the documents, such as
+    the HTML builders, have one. The code highlighted by parallel writers
+    is not stored.
+    """
+    highlighter = getattr(app.builder, 'highlighter', None)
+    if highlighter is None:
+        return
+    cache = HighlightCache(os.path.join(app.doctreedir, CACHE_FILENAME))
+    highlight_block = highlighter.highlight_block
+
+    def cached_highlight_block(source, lang, opts=None, warn=None,
+                               force=False, **kwargs):
+        if lang != 'rostype':
+            return highlight_block(source, lang, opts, warn, force, **kwargs)
+        if not isinstance(source, unicode):
+            source = source.decode()
+        key = get_key(highlighter, source, lang, opts, kwargs)
+        hlsource = cache.get(key)
+        if hlsource is None:
+            hlsource = highlight_block(source, lang, opts, warn, force,
+                                       **kwargs)
+            cache.set(key, hlsource)
+        return hlsource
+    highlighter.highlight_block = cached_highlight_block
+    app.builder.ros_highlight_cache = cache
+
+
+def save_highlight_cache(app, exception):
+    u"""Write the highlight cache back to the doctree directory
+    """
+    cache = getattr(app.builder, 'ros_highlight_cache', None)
+    if exception is None and cache is not None:
+        cache.save()
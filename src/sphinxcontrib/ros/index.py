@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+u"""
+    sphinxcontrib.ros.index
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Persistent index of package manifests.
+
+    :copyright: Copyright 2015 by otamachan.
+    :license: BSD, see LICENSE for details.
+"""
+from __future__ import print_function
+
+import fnmatch
+import os
+import pickle
+from collections import namedtuple
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+INDEX_FILENAME = 'ros_packages.pickle'
+INDEX_VERSION = 3
+MANIFEST_FILENAME = 'package.xml'
+AMENT_PACKAGES_INDEX = os.path.join('share', 'ament_index', 'resource_index',
+                                    'packages')
+IGNORE_MARKERS = ('CATKIN_IGNORE', 'COLCON_IGNORE', 'AMENT_IGNORE')
+
+
+def list_directory(path):
+    u"""Return the names of the entries and the subdirectories
+
+    The subdirectories are pairs of the name and whether it is a symbolic
+    link.
+    """
+    if scandir is not None:
+        names = []
+        dirnames = []
+        for entry in scandir(path):
+            names.append(entry.name)
+            try:
+                if entry.is_dir():
+                    dirnames.append((entry.name, entry.is_symlink()))
+            except OSError:
+                pass
+        return names, dirnames
+    names = os.listdir(path)
+    return names, [(name, os.path.islink(os.path.join(path, name)))
+                   for name in names
+                   if os.path.isdir(os.path.join(path, name))]
+
+
+def get_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def find_package_paths(base_abspath, exclude_patterns=(), dirs=None):
+    u"""Return the relative paths of the packages under the base path
+
+    Unlike catkin_pkg, the walk does not descend into a package, nor into
+    hidden directories, directories containing an ignore marker and
+    directories whose relative path or name matches one of the exclude
+    patterns. Each directory is listed once, and its mtime is stored by
+    path in ``dirs`` if given.
+    """
+    paths = []
+    links = set()  # real paths of the linked directories walked
+    stack = ['']
+    while stack:
+        relpath = stack.pop()
+        path = os.path.join(base_abspath, relpath)
+        if dirs is not None:
+            dirs[path] = get_mtime(path)
+        try:
+            names, dirnames = list_directory(path)
+        except OSError:
+            continue
+        if any(marker in names for marker in IGNORE_MARKERS):
+            continue
+        if MANIFEST_FILENAME in names:
+            paths.append(relpath or '.')
+            continue
+        for dirname, is_link in sorted(dirnames, reverse=True):
+            subpath = os.path.join(relpath, dirname)
+            if dirname.startswith('.') or \
+               any(fnmatch.fnmatch(subpath, pattern) or
+                   fnmatch.fnmatch(dirname, pattern)
+                   for pattern in exclude_patterns):
+                continue
+            if is_link:
+                realpath = os.path.realpath(os.path.join(path, dirname))
+                if realpath in links:  # avoid walking a loop forever
+                    continue
+                links.add(realpath)
+            stack.append(subpath)
+    return sorted(paths)
+
+
+def parse_package_name(manifest):
+    u"""Return the name of the package, reading the manifest up to <name>
+
+    Returns None if the name cannot be found.
+    """
+    try:
+        from xml.etree import cElementTree as ElementTree
+    except ImportError:  # removed in Python 3.9
+        from xml.etree import ElementTree
+    depth = 0
+    try:
+        for event, element in ElementTree.iterparse(manifest,
+                                                    ('start', 'end')):
+            if event == 'start':
+                depth += 1
+                continue
+            if depth == 2 and element.tag == 'name':
+                return (element.text or '').strip() or None
+            depth -= 1
+    except SyntaxError:  # ElementTree.ParseError
+        pass
+    return None
+
+
+class PackageEntry(namedtuple('PackageEntry', ('name', 'filename'))):
+    u"""A package found under a base path
+
+    Only the name is read from the manifest, see PackageIndex.get_package
+    for the whole package.
+    """
+    __slots__ = ()
+
+
+class PackageIndex(object):
+    u"""Parsed package manifests stored under the doctree directory
+
+    Each entry is keyed by the path of ``package.xml`` and remembers the
+    mtime and the size of the file, so that a manifest is read again only
+    when it has been changed or newly appeared. Crawling reads only the
+    names of the packages, and a manifest is parsed fully only when the
+    package is needed. The walk of each crawled path is kept as well, so
+    that a path is walked again only when one of its directories has been
+    changed.
+    """
+    def __init__(self, filename=None):
+        self.filename = filename
+        # manifest path -> (mtime, size, name, package or None)
+        self.entries = {}
+        # base path -> (exclude patterns, {directory: mtime}, manifests)
+        self.walks = {}
+        self.modified = False
+        # base path -> {name: PackageEntry}, kept per build
+        self.crawled = {}
+        # (prefix, name) -> PackageEntry or None, kept per build
+        self.installed = {}
+        self.exclude_patterns = ()
+        if filename:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.filename, 'rb') as f:
+                version, data = pickle.load(f)
+        except Exception:
+            # missing or broken index, just start from scratch
+            return
+        if version == INDEX_VERSION:
+            self.entries, self.walks = data
+
+    def save(self):
+        if not self.modified or not self.filename:
+            return
+        dirname = os.path.dirname(self.filename)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'wb') as f:
+            pickle.dump((INDEX_VERSION, (self.entries, self.walks)), f,
+                        pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_filename, self.filename)
+        self.modified = False
+
+    def get_entry(self, manifest):
+        u"""Return the entry of the manifest if it has not been changed
+        """
+        stat = os.stat(manifest)
+        entry = self.entries.get(manifest)
+        if entry and entry[0] == stat.st_mtime and entry[1] == stat.st_size:
+            return entry, stat
+        return None, stat
+
+    def get_name(self, manifest):
+        u"""Return the name of the package, read it only if changed
+        """
+        entry, stat = self.get_entry(manifest)
+        if entry:
+            return entry[2]
+        name = parse_package_name(manifest)
+        if name is None:
+            return self.get_package(manifest).name
+        self.entries[manifest] = (stat.st_mtime, stat.st_size, name, None)
+        self.modified = True
+        return name
+
+    def get_package(self, manifest):
+        u"""Return the package of the manifest, parse it only if changed
+        """
+        from catkin_pkg.package import parse_package
+        entry, stat = self.get_entry(manifest)
+        if entry and entry[3] is not None:
+            return entry[3]
+        package = parse_package(manifest)
+        self.entries[manifest] = (stat.st_mtime, stat.st_size, package.name,
+                                  package)
+        self.modified = True
+        return package
+
+    def find_packages(self, base_abspath):
+        u"""Return a dict mapping names to packages under the base path
+
+        The base path is crawled only once per build.
+        """
+        packages = self.crawled.get(base_abspath)
+        if packages is None:
+            packages = self.crawl(base_abspath)
+            self.crawled[base_abspath] = packages
+        return packages
+
+    def probe(self, path, name):
+        u"""Return the package in ``<path>/<name>`` or None
+
+        The directory is skipped like the crawl of the path skips it: if it
+        is hidden, contains an ignore marker or matches an exclude pattern,
+        or if the path itself is a package or ignored.
+        """
+        package_path = os.path.join(path, name)
+        manifest = os.path.join(package_path, MANIFEST_FILENAME)
+        if name.startswith('.') or \
+           any(fnmatch.fnmatch(name, pattern)
+               for pattern in self.exclude_patterns) or \
+           not os.path.isfile(manifest) or \
+           os.path.isfile(os.path.join(path, MANIFEST_FILENAME)) or \
+           any(os.path.exists(os.path.join(directory, marker))
+               for directory in (path, package_path)
+               for marker in IGNORE_MARKERS):
+            return None
+        if self.get_name(manifest) == name:
+            return PackageEntry(name, manifest)
+        return None
+
+    def find_installed(self, prefix, name):
+        u"""Return the package installed under the prefix or None
+
+        If the prefix has an ament resource index, the package is installed
+        if it has a marker in the index. Otherwise, it is a catkin install
+        space. In either case, the manifest is ``share/<name>/package.xml``
+        so that only a few files are checked instead of crawling.
+        """
+        key = (prefix, name)
+        if key not in self.installed:
+            package = None
+            manifest = os.path.join(prefix, 'share', name, MANIFEST_FILENAME)
+            ament_index = os.path.join(prefix, AMENT_PACKAGES_INDEX)
+            if os.path.isdir(ament_index) and \
+               not os.path.isfile(os.path.join(ament_index, name)):
+                pass
+            elif os.path.isfile(manifest):
+                package = PackageEntry(name, manifest)
+            self.installed[key] = package
+        return self.installed[key]
+
+    def export(self, base_abspath):
+        u"""Return the walk and the entries of the packages crawled under the
+        base path
+        """
+        return (self.walks.get(base_abspath),
+                {package.filename: self.entries[package.filename]
+                 for package in self.crawled[base_abspath].values()})
+
+    def merge(self, base_abspath, exported):
+        u"""Merge the crawl exported from another process
+        """
+        walk, entries = exported
+        self.merge_entries(entries)
+        if walk is not None and self.walks.get(base_abspath) != walk:
+            self.walks[base_abspath] = walk
+            self.modified = True
+        self.crawled[base_abspath] = {
+            entry[2]: PackageEntry(entry[2], manifest)
+            for manifest, entry in entries.items()}
+
+    def merge_entries(self, entries):
+        for manifest, entry in entries.items():
+            # do not lose the package parsed in this process
+            if entry[3] is None and manifest in self.entries and \
+               self.entries[manifest][:3] == entry[:3]:
+                continue
+            self.entries[manifest] = entry
+            self.modified = True
+
+    def find_all_packages(self, base_abspaths):
+        u"""Crawl the base paths not crawled yet concurrently
+
+        The threads only walk the paths and read the names of the packages,
+        the index is updated in the calling thread.
+        """
+        uncrawled = [base_abspath for base_abspath in set(base_abspaths)
+                     if base_abspath not in self.crawled]
+        if len(uncrawled) > 1:
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(min(len(uncrawled), 8))
+            try:
+                scans = pool.map(self.scan, uncrawled)
+            finally:
+                pool.close()
+            for base_abspath, scan in zip(uncrawled, scans):
+                self.crawled[base_abspath] = self.crawl(base_abspath, scan)
+
+    def scan(self, base_abspath):
+        u"""Return the walk of the base path, the manifests with the names of
+        their packages and the new entries
+
+        The walk of the last crawl is reused if none of its directories has
+        been changed since. The index is only read, so that several paths
+        can be scanned at once.
+        """
+        walk = self.walks.get(base_abspath)
+        if walk is None or walk[0] != self.exclude_patterns or \
+           any(get_mtime(path) != mtime for path, mtime in walk[1].items()):
+            dirs = {}
+            walk = (self.exclude_patterns, dirs, [
+                os.path.normpath(os.path.join(base_abspath, path,
+                                              MANIFEST_FILENAME))
+                for path in find_package_paths(base_abspath,
+                                               self.exclude_patterns, dirs)])
+        manifests = []
+        entries = {}
+        for manifest in walk[2]:
+            entry, stat = self.get_entry(manifest)
+            if entry is None:
+                package = None
+                name = parse_package_name(manifest)
+                if name is None:
+                    from catkin_pkg.package import parse_package
+                    package = parse_package(manifest)
+                    name = package.name
+                entry = (stat.st_mtime, stat.st_size, name, package)
+                entries[manifest] = entry
+            manifests.append((manifest, entry[2]))
+        return walk, manifests, entries
+
+    def crawl(self, base_abspath, scan=None):
+        walk, manifests, entries = scan or self.scan(base_abspath)
+        if self.walks.get(base_abspath) is not walk:
+            self.walks[base_abspath] = walk
+            self.modified = True
+        if entries:
+            self.entries.update(entries)
+            self.modified = True
+        packages = {}
+        for manifest, name in manifests:
+            packages[name] = PackageEntry(name, manifest)
+        # forget manifests removed from the base path
+        found = set(manifest for manifest, _ in manifests)
+        prefix = os.path.join(base_abspath, '')
+        for manifest in list(self.entries):
+            if manifest.startswith(prefix) and manifest not in found:
+                del self.entries[manifest]
+                self.modified = True
+        return packages
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+u"""
+    sphinxcontrib.ros.inventory
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    ROS objects of the inventories loaded by sphinx.ext.intersphinx.
+
+    :copyright: Copyright 2015 by otamachan.
+    :license: BSD, see LICENSE for details.
+"""
+from __future__ import print_function
+
+from os import path
+
+from docutils import nodes
+from docutils.utils import relative_path
+from sphinx.locale import _
+
+
+def get_short_names(fullnames):
+    u"""Map the last part of the names to the sorted ``(objtype, name)``
+    """
+    short_names = {}
+    for fullname in fullnames:
+        short_name = fullname[1].rsplit('/', 1)[-1]
+        short_names.setdefault(short_name, []).append(fullname)
+    for candidates in short_names.values():
+        candidates.sort()
+    return short_names
+
+
+def find_candidates(objects, short_names, objtypes, target, package):
+    u"""Return the objects a reference may point to
+
+    ``objects`` contains the ``(objtype, name)`` of the objects and
+    ``short_names`` is called to get their short names only if the target
+    is neither a qualified name nor a name relative to ``package``.
+    """
+    for objtype in objtypes:
+        if (objtype, target) in objects:
+            return [(objtype, target)]
+    if '/' in target:
+        return []
+    if package:
+        for objtype in objtypes:
+            if (objtype, package + '/' + target) in objects:
+                return [(objtype, package + '/' + target)]
+    return [fullname for fullname in short_names().get(target, ())
+            if fullname[0] in objtypes]
+
+
+class ExternalObjects(object):
+    u"""ROS objects of the intersphinx inventories
+
+    Built once from the inventories cached in the environment by
+    sphinx.ext.intersphinx, so that the references to the packages and
+    types documented by other projects are resolved by qualified,
+    package-relative or short name like the local ones, without reading
+    the other projects.
+    """
+    def __init__(self, inventory, objtypes):
+        self.inventory = inventory
+        # (objtype, name) -> (project, version, uri, display name)
+        self.objects = {}
+        for objtype in objtypes:
+            for name, entry in inventory.get('ros:' + objtype, {}).items():
+                self.objects[(objtype, name)] = entry
+        self._short_names = None
+
+    def short_names(self):
+        if self._short_names is None:
+            self._short_names = get_short_names(self.objects)
+        return self._short_names
+
+    def find_candidates(self, objtypes, target, package):
+        if not self.objects or ':' in target:
+            # targets prefixed by the name of an inventory are left to
+            # sphinx.ext.intersphinx
+            return []
+        return find_candidates(self.objects, self.short_names,
+                               objtypes, target, package)
+
+    def make_refnode(self, env, fromdocname, fullname, contnode):
+        u"""Return the reference to the object like sphinx.ext.intersphinx
+        """
+        project, version, uri, _dispname = self.objects[fullname]
+        if '://' not in uri and fromdocname:
+            # a local inventory, relative to the document as intersphinx does
+            uri = path.join(relative_path(fromdocname, env.srcdir), uri)
+        newnode = nodes.reference('', '', internal=False, refuri=uri,
+                                  reftitle=_('(in %s v%s)') % (project,
+                                                               version))
+        newnode.append(contnode)
+        return newnode
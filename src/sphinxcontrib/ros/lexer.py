@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+u"""
+    sphinxcontrib.ros.lexer
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Lexer of the ROS type files.
+
+    :copyright: Copyright 2015 by Tamaki Nishino.
+    :license: BSD, see LICENSE for details.
+"""
+from __future__ import print_function
+
+import re
+
+from pygments.lexer import Lexer
+from pygments.token import (Punctuation, Literal,
+                            Text, Comment, Operator, Name, Number, Keyword)
+
+from .message import BUILTIN_TYPES, DEFINITION_SEPARATOR
+
+LINE_RE = re.compile(r'[^\n]*\n?')
+MSG_RE = re.compile(r'(MSG)(:)([ \t]*)([\w/]+)$')
+STRING_CONSTANT_RE = re.compile(
+    r'(string)([ \t]+)([a-zA-Z_]\w*)([ \t]*)(=)([ \t]*)(.*)$')
+FIELD_RE = re.compile(r'([\w/]+)'
+                      r'(?:([ \t]*)(\[)([ \t]*)(\d*)([ \t]*)(\]))?'
+                      r'(?:([ \t]+)(\w+))?')
+VALUE_RE = re.compile(r'(?:([ \t]*)(=)([ \t]*)'
+                      r'(?:(\-?(?:\d+\.\d*(?:[eE][+\-]?\d+)?|'
+                      r'\.\d+(?:[eE][+\-]?\d+)?|\d+[eE][+\-]?\d+))(?![^\s#])|'
+                      r'(\-?0[xX][0-9a-fA-F]+)(?![^\s#])|'
+                      r'(\-?\d+)(?![^\s#])|([^\s#]+))?)?')
+SPACE_RE = re.compile(r'[ \t]*')
+BUILTIN_TYPE_SET = frozenset(BUILTIN_TYPES)
+
+
+class ROSTypeLexer(Lexer):
+    u"""Lexer of the ROS type files and of the full definitions
+
+    The files are line oriented, so each line is split by a few
+    precompiled expressions instead of trying every rule at every token.
+    """
+    name = 'ROSTYPE'
+    aliases = ['rostype']
+    filenames = ['*.msg', '*.srv', '*.action']
+
+    def get_tokens_unprocessed(self, text):
+        for match in LINE_RE.finditer(text):
+            line = match.group()
+            if not line:
+                break
+            start = match.start()
+            if line.endswith('\n'):
+                body = line[:-1]
+            else:
+                body = line
+            if body == DEFINITION_SEPARATOR or body == '---':
+                yield start, Keyword, line
+                continue
+            for pos, token, value in self.get_line_tokens(body):
+                yield start + pos, token, value
+            if body is not line:
+                yield start + len(body), Text, u'\n'
+
+    def get_line_tokens(self, line):
+        match = MSG_RE.match(line)
+        if match:
+            for token in get_group_tokens(match, (Keyword, Punctuation, Text,
+                                                  Name.Class)):
+                yield token
+            return
+        pos = SPACE_RE.match(line).end()
+        if pos:
+            yield 0, Text, line[:pos]
+        match = STRING_CONSTANT_RE.match(line, pos)
+        if match:
+            for token in get_group_tokens(match, (Name.Builtin, Text,
+                                                  Name.Property, Text,
+                                                  Operator, Text,
+                                                  Literal.String)):
+                yield token
+            return
+        match = FIELD_RE.match(line, pos)
+        if match:
+            if match.group(1) in BUILTIN_TYPE_SET:
+                type_token = Name.Builtin
+            else:
+                type_token = Name.Class
+            for token in get_group_tokens(match, (type_token, Text,
+                                                  Punctuation, Text,
+                                                  Number.Integer, Text,
+                                                  Punctuation, Text,
+                                                  Name.Property)):
+                yield token
+            pos = match.end()
+            match = VALUE_RE.match(line, pos)
+            if match.group(2):
+                for token in get_group_tokens(match, (Text, Operator, Text,
+                                                      Number.Float,
+                                                      Number.Hex,
+                                                      Number.Integer,
+                                                      Literal)):
+                    yield token
+                pos = match.end()
+        end = SPACE_RE.match(line, pos).end()
+        if end > pos:
+            yield pos, Text, line[pos:end]
+            pos = end
+        if pos < len(line):
+            if line[pos] == '#':
+                yield pos, Comment.Single, line[pos:]
+            else:
+                yield pos, Text, line[pos:]
+
+
+def get_group_tokens(match, tokens):
+    u"""Yield the tokens of the groups of the match, but the empty ones
+    """
+    for group, token in enumerate(tokens, 1):
+        value = match.group(group)
+        if value:
+            yield match.start(group), token, value
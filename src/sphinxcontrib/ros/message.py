@@ -12,26 +12,33 @@ from __future__ import print_function
 
 import os
 import codecs
+import fnmatch
+import hashlib
 import re
+from collections import namedtuple
 from sphinx.locale import l_
 from docutils import nodes
 from docutils.statemachine import StringList
 from docutils.parsers.rst import directives
-from sphinx.util.docfields import TypedField, GroupedField
+from sphinx.util.docfields import Field, TypedField, GroupedField
 
-from pygments.lexer import RegexLexer, include, bygroups
-from pygments.token import (Punctuation, Literal,
-                            Text, Comment, Operator, Name, Number, Keyword)
+from .base import (ROSObjectDescription, DocFieldBuilder, get_file_state,
+                   make_code_block)
 
-from .base import ROSObjectDescription
-
-BUILTIN_TYPES = ('bool', 'byte',
+BUILTIN_TYPES = ('bool', 'byte', 'char',
                  'int8', 'uint8', 'int16', 'uint16',
                  'int32', 'uint32', 'int64', 'uint64',
                  'float32', 'float64', 'string', 'time', 'duration', 'Header')
+DEFINITION_SEPARATOR = u'=' * 80
 TYPE_SUFFIX = 'type'
 VALUE_SUFFIX = 'value'
 
+# kinds of the records yielded by tokenize
+FIELD = 'field'  # a field or a constant
+SEPARATOR = 'separator'  # ---
+COMMENT = 'comment'  # a block of consecutive comment and blank lines
+INVALID = 'invalid'
+
 
 def split_blocks(strings):
     u"""Split StringList into list of StringList
@@ -61,6 +68,47 @@ def join_blocks(blocks):
     return strings
 
 
+def interface_key(file_path, file_content):
+    u"""Return the key of the parsed type file in the environment
+    """
+    digest = hashlib.sha1(u'\n'.join(file_content.data).encode('utf-8'))
+    return (file_path, digest.hexdigest())
+
+
+def get_md5_text(fields, md5sums):
+    u"""Return the text hashed into the md5sum like genmsg
+
+    Constants come first, and the type of a field of a message type is
+    replaced with the md5sum of the message type found in md5sums.
+    """
+    lines = [u'{0} {1}={2}'.format(field.type, field.name, field.value.strip())
+             for field in fields if field.value]
+    for field in fields:
+        if field.value:
+            continue
+        if '/' in field.type:
+            lines.append(u'{0} {1}'.format(md5sums[field.type], field.name))
+        else:
+            lines.append(u'{0}{1} {2}'.format(field.type, field.size,
+                                              field.name))
+    return u'\n'.join(lines)
+
+
+def get_md5sum(all_fields, md5sums):
+    u"""Return the md5sum of the message or the service
+    """
+    text = u''.join(get_md5_text(fields, md5sums) for fields in all_fields)
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
+def expand_option(argument):
+    u"""Parse the expand option: an optional maximum depth
+    """
+    if argument is None or not argument.strip():
+        return None
+    return directives.nonnegative_int(argument)
+
+
 def align_strings(strings, header=''):
     u"""Align StringList
 
@@ -73,40 +121,130 @@ def align_strings(strings, header=''):
             strings.data[index] = header + strings.data[index][min_spaces:]
 
 
-class ROSField(object):
+def get_field_body(desc, quote=False):
+    u"""Get the body of the field of a description of several lines
+
+    The lines are aligned as docutils reads the body of a field: the
+    following lines independently of the first one.
+    """
+    align_strings(desc, '| ' if quote else '')
+    rest = desc[1:]
+    align_strings(rest)
+    return StringList([desc[0].lstrip()], items=[desc.info(0)]) + rest
+
+
+def tokenize(lines):
+    u"""Split the lines of a type file into records in a single pass
+
+    Yields ``(kind, index, value)`` tuples, where index is the index of the
+    (first) line in ``lines``. The value is the match object of
+    :attr:`ROSField.matcher` for FIELD, the index next to the last line of
+    the block for COMMENT and the stripped line otherwise.
+    """
+    match = ROSField.matcher.match
+    start = None
+    for index, line in enumerate(lines):
+        line = line.strip()
+        if not line or line[0] == '#':
+            if start is None:
+                start = index
+            continue
+        if start is not None:
+            yield COMMENT, start, index
+            start = None
+        if not line.strip('-'):
+            yield SEPARATOR, index, line
+        else:
+            result = match(line)
+            if result is None:
+                yield INVALID, index, line
+            else:
+                yield FIELD, index, result
+    if start is not None:
+        yield COMMENT, start, len(lines)
+
+
+class ROSTypeSource(object):
+    u"""The lines of a type file shared by the fields parsed from it
+    """
+    __slots__ = ('path', 'lines')
+
+    def __init__(self, path, lines):
+        self.path = path
+        self.lines = lines
+
+    def __getstate__(self):
+        return (self.path, self.lines)
+
+    def __setstate__(self, state):
+        self.path, self.lines = state
+
+    def get_comments(self, start, stop):
+        u"""Get the comment and blank lines in the range as StringList
+        """
+        data = []
+        items = []
+        for index in range(start, stop):
+            line = self.lines[index].strip()
+            if not line or line[0] == '#':
+                data.append(line[1:])
+                items.append((self.path, index))
+        return StringList(data, items=items)
+
+
+class ROSField(namedtuple('ROSField', ('name', 'type', 'size', 'value',
+                                       'trailing_comment', 'type_source',
+                                       'offset', 'pre_start', 'post_stop'))):
     u"""A field or constant in a message file with comments
+
+    The comments are kept as line ranges of the type source and only
+    turned into StringList when they are rendered: the lines in
+    ``[pre_start, offset)`` are the comments above the field and the lines
+    in ``(offset, post_stop)`` are the comments below it.
     """
+    __slots__ = ()
     matcher = re.compile(r'([\w/]+)(\s*\[\s*\d*\s*\])?'
                          '\s+(\w+)(\s*=\s*[^#]+)?(\s*)(#.*)?$')
 
-    def __init__(self, line, source=None, offset=0,
-                 pre_comments='', package_name=''):
-        self.source = source
-        self.offset = offset
-        result = self.matcher.match(line)
-        if result is None:
-            self.name = None
-            return
-        self.name = result.group(3)
-        self.type = result.group(1)
-        self.size = result.group(2).replace(' ', '') if result.group(2) else ''
-        self.value = result.group(4).lstrip()[1:] if result.group(4) else ''
-        comment = result.group(6) if result.group(6) else ''
-        if self.type == 'string' and self.value:
-            self.value += result.group(5) + comment
+    @classmethod
+    def from_match(cls, result, package_name, type_source, offset,
+                   pre_start, post_stop):
+        field_type, size, name, value, spaces, comment = result.groups()
+        size = size.replace(' ', '') if size else ''
+        value = value.lstrip()[1:] if value else ''
+        comment = comment if comment else ''
+        if field_type == 'string' and value:
+            value += spaces + comment
             comment = ''
         else:
-            self.value = self.value.strip()
+            value = value.strip()
             comment = comment[1:]
-        if self.type not in BUILTIN_TYPES:
-            if '/' not in self.type:
+        if field_type not in BUILTIN_TYPES:
+            if '/' not in field_type:
                 # if the type is not builtin type and misses the package name
-                self.type = package_name + '/' + self.type
-        elif self.type == 'Header':
-            self.type = 'std_msgs/Header'
-        self.comment = StringList([comment], items=[(source, offset)])
-        self.pre_comments = pre_comments
-        self.post_comments = StringList()
+                field_type = package_name + '/' + field_type
+        elif field_type == 'Header':
+            field_type = 'std_msgs/Header'
+        return cls(name, field_type, size, value, comment, type_source,
+                   offset, pre_start, post_stop)
+
+    @property
+    def source(self):
+        return self.type_source.path
+
+    @property
+    def comment(self):
+        return StringList([self.trailing_comment],
+                          items=[(self.type_source.path, self.offset)])
+
+    @property
+    def pre_comments(self):
+        return self.type_source.get_comments(self.pre_start, self.offset)
+
+    @property
+    def post_comments(self):
+        return self.type_source.get_comments(self.offset + 1,
+                                             self.post_stop)
 
     def get_description(self, field_comment_option):
         u"""Get the description of the field
@@ -176,6 +314,31 @@ class ROSFieldGroup(object):
                                  source=field.source, offset=field.offset)
         return docfields
 
+    def add_docfields(self, directive, builder, fields, field_comment_option):
+        u"""Add the fields make_docfields writes to the builder as nodes
+        """
+        for field in fields:
+            field_type = self.constant_name if field.value else self.field_name
+            name = field.name + field.size
+            desc = field.get_description(field_comment_option)
+            if len(desc) > 1:
+                desc = get_field_body(desc, 'quote' in field_comment_option)
+            line = field.offset + 1
+            builder.add_field(field_type, name,
+                              directive.parse_field_body(desc),
+                              field.source, line)
+            builder.add_field(
+                u'{0}-{1}'.format(field_type, TYPE_SUFFIX), name,
+                directive.parse_field_body(StringList(
+                    [field.type], items=[(field.source, field.offset)])),
+                field.source, line)
+            if field.value:
+                builder.add_field(
+                    u'{0}-{1}'.format(field_type, VALUE_SUFFIX), name,
+                    directive.parse_field_body(StringList(
+                        [field.value], items=[(field.source, field.offset)])),
+                    field.source, line)
+
     def get_doc_field_types(self):
         return [
             TypedField(self.field_name,
@@ -212,7 +375,9 @@ class ROSTypeFile(object):
     def get_doc_field_types(self):
         return [doc_field_type
                 for field_group in self.groups
-                for doc_field_type in field_group.get_doc_field_types()]
+                for doc_field_type in field_group.get_doc_field_types()] + [
+            Field('md5sum', label=l_('MD5Sum'), names=('md5sum',),
+                  has_arg=False)]
 
     def get_doc_merge_fields(self):
         doc_merge_fields = {}
@@ -220,11 +385,14 @@ class ROSTypeFile(object):
             doc_merge_fields.update(field_group.get_doc_merge_fields())
         return doc_merge_fields
 
-    def read(self, package_path, ros_type):
+    def read(self, package_path, ros_type, snapshot=None):
         type_file = os.path.join(package_path,
                                  self.ext,
                                  ros_type+'.'+self.ext)
-        if not os.path.exists(type_file):
+        lines = snapshot.files.get(type_file) if snapshot else None
+        if lines is not None:
+            file_content = StringList(list(lines), source=type_file)
+        elif not os.path.exists(type_file):
             file_content = None
         else:
             raw_content = codecs.open(type_file, 'r', 'utf-8').read()
@@ -232,36 +400,61 @@ class ROSTypeFile(object):
                                       source=type_file)
         return type_file, file_content
 
+    def read_all(self, package_path, pattern, snapshot=None):
+        u"""Read all type files whose type name matches the pattern
+
+        Returns the path of the type directory and
+        a list of (type name, type file, file content). The lines of the
+        files in the snapshot, if given, are not read again.
+        """
+        type_dir = os.path.join(package_path, self.ext)
+        suffix = '.' + self.ext
+        try:
+            filenames = sorted(os.listdir(type_dir))
+        except OSError:
+            return type_dir, []
+        type_files = []
+        for filename in filenames:
+            ros_type = filename[:-len(suffix)]
+            if filename.endswith(suffix) and \
+               fnmatch.fnmatchcase(ros_type, pattern):
+                type_file, file_content = self.read(package_path, ros_type,
+                                                    snapshot)
+                type_files.append((ros_type, type_file, file_content))
+        return type_dir, type_files
+
     def parse(self, file_content, package_name):
-        u"""
+        u"""Parse the type file into a list of fields for each group
         """
         all_fields = []
         fields = []
-        pre_comments = StringList()
-        for item in file_content.xitems():  # (source, offset, value)
-            line = item[2].strip()
-            if line and not [c for c in line if not c == '-']:
+        type_source = ROSTypeSource(file_content.source(0) if file_content
+                                    else None, tuple(file_content.data))
+        pre_start = 0  # the first line of the comments above the next field
+        last = None  # (match, offset, pre_start) of the last field
+
+        def add_last_field(post_stop):
+            fields.append(ROSField.from_match(last[0], package_name,
+                                              type_source, last[1], last[2],
+                                              post_stop))
+
+        for kind, index, value in tokenize(file_content.data):
+            if kind is FIELD:
+                if last:
+                    add_last_field(index)
+                last = (value, index, pre_start)
+                pre_start = index + 1
+            elif kind is SEPARATOR:
+                if last:
+                    add_last_field(index)
+                    last = None
                 all_fields.append(fields)
                 fields = []
-            elif line == '' or line[0] == '#':
-                if line:
-                    line = line[1:]
-                if fields:
-                    fields[-1].post_comments.append(line,
-                                                    source=item[0],
-                                                    offset=item[1])
-                pre_comments.append(line, source=item[0], offset=item[1])
-            else:
-                new_field = ROSField(line, source=item[0], offset=item[1],
-                                     pre_comments=pre_comments,
-                                     package_name=package_name)
-                # if sucessfully parsed
-                if new_field.name:
-                    fields.append(new_field)
-                    pre_comments = StringList()
-                else:
-                    # todo
-                    print("?? <%s>" % line)
+            elif kind is INVALID:
+                # todo
+                print("?? <%s>" % value)
+        if last:
+            add_last_field(len(file_content.data))
         all_fields.append(fields)
         return all_fields
 
@@ -272,6 +465,12 @@ class ROSTypeFile(object):
                                                         field_comment_option))
         return docfields
 
+    def add_docfields(self, directive, builder, all_fields,
+                      field_comment_option):
+        for field_group, fields in zip(self.groups, all_fields):
+            field_group.add_docfields(directive, builder, fields,
+                                      field_comment_option)
+
 
 class ROSType(ROSObjectDescription):
     has_arguments = True
@@ -292,16 +491,29 @@ class ROSAutoType(ROSType):
         'description': directives.unchanged,
         'raw': lambda x: directives.choice(x, ('head', 'tail')),
         'field-comment': directives.unchanged,
+        'expand': expand_option,
+        'md5sum': directives.flag,
+        'definition': directives.flag,
     }
 
+    preloaded = None  # (package, type file, file content) set by run_glob
+    # (base path, message type) -> (type file, cache key, fields, lines),
+    # the last three None if the file is missing
+    _type_graph = {}
+    _md5sums = {}  # (base path, message type) -> md5sum
+
     def update_content(self):
         package_name, type_name = self.arguments[0].split('/', 1)
-        package = self.find_package(package_name)
-        if not package:
-            return
-        file_path, file_content \
-            = self.type_file.read(os.path.dirname(package.filename),
-                                  type_name)
+        if self.preloaded:
+            package, file_path, file_content = self.preloaded
+        else:
+            package = self.find_package(package_name)
+            if not package:
+                return
+            with self.profile('read'):
+                file_path, file_content \
+                    = self.type_file.read(os.path.dirname(package.filename),
+                                          type_name, self._snapshot)
         if file_content is None:
             self.state_machine.reporter.warning(
                 'cannot find file {0}'.format(file_path),
@@ -310,12 +522,48 @@ class ROSAutoType(ROSType):
         type_relfile = os.path.relpath(file_path, self.env.srcdir)
         self.env.note_dependency(type_relfile)
 
-        fields = self.type_file.parse(file_content, package_name)
+        fields = self.parse_type_file(file_path, file_content, package_name)
 
-        # fields
+        # fields, built as nodes unless the content may continue them
+        build_nodes = self.env.config.ros_build_nodes and \
+            not (self.content and self.content[0].startswith(':'))
         options = self.options.get('field-comment', '')
         field_comment_option = options.encode('ascii').lower().split()
-        content = self.type_file.make_docfields(fields, field_comment_option)
+        with self.profile('make_docfields'):
+            if build_nodes:
+                builder = DocFieldBuilder(self)
+                self.type_file.add_docfields(self, builder, fields,
+                                             field_comment_option)
+                content = StringList()
+            else:
+                content = self.type_file.make_docfields(fields,
+                                                        field_comment_option)
+
+        # md5sum and full definition
+        definition = None
+        if 'md5sum' not in self.options and \
+           'definition' not in self.options:
+            pass
+        elif self.type_file.ext == 'action':
+            self.state_machine.reporter.warning(
+                'md5sum and definition are not defined for actions',
+                line=self.lineno)
+        else:
+            definition = self.get_definition(
+                fields, interface_key(file_path, file_content),
+                file_content.data)
+        if definition and 'md5sum' in self.options:
+            if build_nodes:
+                builder.add_field('md5sum', '', self.parse_field_body(
+                    StringList([definition[0]], items=[(file_path, 0)])),
+                    file_path, 1)
+            else:
+                content.append(u':md5sum: {0}'.format(definition[0]),
+                               source=file_path, offset=0)
+        if build_nodes:
+            field_list = builder.make_field_list()
+            self.head_nodes = [field_list] if field_list else []
+            self.tail_nodes = []
 
         # description
         if fields[0] and fields[0][0]:
@@ -348,21 +596,286 @@ class ROSAutoType(ROSType):
                     content = content + StringList([u'']) + description
 
         content = content + self.content
+        # expanded fields
+        if 'expand' in self.options:
+            content = self.add_code_block(
+                content, self.expand_fields(fields, self.options['expand']),
+                build_nodes)
+        if definition and 'definition' in self.options:
+            content = self.add_code_block(
+                content, StringList([u'    ' + line if line else u''
+                                     for line in definition[1].splitlines()],
+                                    source=file_path),
+                build_nodes)
         # raw file content
         raw_option = self.options.get('raw', None)
-        #
         if raw_option is not None:
-            code_block = StringList([u'', u'.. code-block:: rostype', u''])
-            code_block.extend(StringList(['    '+l for l in file_content.data],
-                                         items=file_content.items))
-            if raw_option == 'head':
-                content = code_block + StringList([u'']) + content
-            elif raw_option == 'tail':
-                content = content + code_block
+            content = self.add_code_block(
+                content, StringList(['    '+l for l in file_content.data],
+                                    items=file_content.items),
+                build_nodes, head=(raw_option == 'head'))
         return content
 
+    def add_code_block(self, content, lines, build_nodes, head=False):
+        u"""Add a rostype code block of the indented lines to the content
+
+        The block is put at the head or at the tail of the content, as a
+        node if build_nodes is true.
+        """
+        if build_nodes:
+            source, offset = lines.info(0) if lines else (None, None)
+            literal = make_code_block(lines.data, 'rostype', source,
+                                      None if offset is None else offset + 1)
+            if head:
+                self.head_nodes.insert(0, literal)
+            else:
+                self.tail_nodes.append(literal)
+            return content
+        code_block = StringList([u'', u'.. code-block:: rostype', u''])
+        code_block.extend(lines)
+        if head:
+            return code_block + StringList([u'']) + content
+        return content + code_block
+
+    def parse_type_file(self, file_path, file_content, package_name):
+        u"""Parse the type file, reusing the result cached in the environment
+
+        The parsed fields are keyed by the file path and the hash of its
+        content, so that the same file is parsed only once across pages
+        and builds.
+        """
+        data = self.env.domaindata['ros']
+        key = interface_key(file_path, file_content)
+        fields = self.get_fields(self.type_file, key, file_content,
+                                 package_name)
+        data['interfaces'][key] = fields
+        data['interface_keys'].setdefault(self.env.docname, set()).add(key)
+        return fields
+
+    def get_fields(self, type_file, key, file_content, package_name):
+        u"""Return the fields cached in the environment or in the snapshot
+
+        The type file is parsed only if it is in neither of them.
+        """
+        fields = self.env.domaindata['ros']['interfaces'].get(key)
+        if fields is None and self._snapshot is not None:
+            fields = self._snapshot.interfaces.get(key)
+        self.count_cache('interfaces', fields is not None)
+        if fields is None:
+            with self.profile('parse'):
+                fields = type_file.parse(file_content, package_name)
+        return fields
+
+    def get_message_node(self, message_type):
+        u"""Get the node of a message type in the type graph
+
+        Each message type is read and parsed once per build, and noted as
+        a dependency of every document using it, even if missing. The node
+        is a tuple of the type file, the key in the environment, the parsed
+        fields and the lines of the file. Returns None if the message type
+        is not found.
+        """
+        package_name, type_name = message_type.split('/', 1)
+        package = self.lookup_package(package_name)
+        if not package:
+            return None
+        graph_key = (self.get_base_abspath(), message_type)
+        self.count_cache('type_graph', graph_key in ROSAutoType._type_graph)
+        if graph_key not in ROSAutoType._type_graph:
+            type_file = ROSMessageBase.type_file
+            with self.profile('read'):
+                file_path, file_content \
+                    = type_file.read(os.path.dirname(package.filename),
+                                     type_name, self._snapshot)
+            node = (file_path, None, None, None)
+            if file_content is not None:
+                key = interface_key(file_path, file_content)
+                fields = self.get_fields(type_file, key, file_content,
+                                         package_name)
+                node = (file_path, key, fields, tuple(file_content.data))
+            ROSAutoType._type_graph[graph_key] = node
+        node = ROSAutoType._type_graph[graph_key]
+        file_path, key, fields = node[:3]
+        self.note_ros_dependency(('file', file_path),
+                                 get_file_state(file_path))
+        if fields is None:
+            return None
+        data = self.env.domaindata['ros']
+        data['interfaces'].setdefault(key, fields)
+        data['interface_keys'].setdefault(self.env.docname, set()).add(key)
+        return node
+
+    def get_message_fields(self, message_type):
+        u"""Get the fields of a message type referenced by a field
+        """
+        node = self.get_message_node(message_type)
+        return node[2] if node else None
+
+    def sort_message_types(self, all_fields):
+        u"""Sort the message types used by the fields in topological order
+
+        Returns the list of the message types, each following the types it
+        depends on, or None with a warning if a type is missing or
+        recursive.
+        """
+        order = []
+        visiting = set()
+
+        def get_field_types(all_fields):
+            field_types = []
+            for fields in all_fields:
+                for field in fields:
+                    if '/' in field.type and field.type not in field_types:
+                        field_types.append(field.type)
+            return field_types
+
+        def visit(message_type):
+            if message_type in visiting:
+                self.state_machine.reporter.warning(
+                    'cannot compute md5sum of recursive type {0}'.format(
+                        message_type), line=self.lineno)
+                return False
+            if message_type in order:
+                return True
+            node = self.get_message_node(message_type)
+            if node is None:
+                self.state_machine.reporter.warning(
+                    'cannot compute md5sum: cannot find type {0}'.format(
+                        message_type), line=self.lineno)
+                return False
+            visiting.add(message_type)
+            for field_type in get_field_types(node[2]):
+                if not visit(field_type):
+                    return False
+            visiting.remove(message_type)
+            order.append(message_type)
+            return True
+
+        visiting.add(self.arguments[0])
+        for field_type in get_field_types(all_fields):
+            if not visit(field_type):
+                return None
+        return order
+
+    def get_definition(self, all_fields, key, lines):
+        u"""Get the md5sum and the full definition of the type
+
+        The md5sums of the message types it depends on are computed
+        bottom-up in topological order, once per type per build. The
+        result is cached in the environment, keyed by the keys of all the
+        type files involved. Returns None if it cannot be computed.
+        """
+        order = self.sort_message_types(all_fields)
+        if order is None:
+            return None
+        base_abspath = self.get_base_abspath()
+        nodes = [ROSAutoType._type_graph[(base_abspath, message_type)]
+                 for message_type in order]
+        cache_key = tuple(node[1] for node in nodes) + (key,)
+        definitions = self.env.domaindata['ros']['definitions']
+        self.count_cache('definitions', cache_key in definitions)
+        if cache_key in definitions:
+            return definitions[cache_key]
+        md5sums = {}
+        for message_type, node in zip(order, nodes):
+            graph_key = (base_abspath, message_type)
+            if graph_key not in ROSAutoType._md5sums:
+                ROSAutoType._md5sums[graph_key] = get_md5sum(node[2], md5sums)
+            md5sums[message_type] = ROSAutoType._md5sums[graph_key]
+        md5sum = get_md5sum(all_fields, md5sums)
+        # the full definition of a message as given by gendeps --cat
+        text = u'\n'.join(lines) + u'\n\n'
+        types = dict(zip(order, nodes))
+        for message_type in self.get_all_depends(all_fields, types, []):
+            text += u'{0}\nMSG: {1}\n{2}\n\n'.format(
+                DEFINITION_SEPARATOR, message_type,
+                u'\n'.join(types[message_type][3]))
+        definition = (md5sum, text[:-1])
+        definitions[cache_key] = definition
+        return definition
+
+    def get_all_depends(self, all_fields, types, depends):
+        u"""List the message types in the order of the full definition
+        """
+        for fields in all_fields:
+            for field in fields:
+                if field.type in types and field.type not in depends:
+                    depends.append(field.type)
+                    self.get_all_depends(types[field.type][2], types,
+                                         depends)
+        return depends
+
+    def expand_fields(self, all_fields, depth=None):
+        u"""Expand the fields of sub-messages recursively like rosmsg show
+
+        The expansion stops at the depth if given, and at message types
+        which are already being expanded.
+        """
+        lines = StringList()
+        for index, fields in enumerate(all_fields):
+            if index > 0:
+                lines.append(u'    ---')
+            self.expand_message(lines, fields, depth, u'    ',
+                                [self.arguments[0]])
+        return lines
+
+    def expand_message(self, lines, fields, depth, indent, expanding):
+        for field in fields:
+            if field.value:
+                lines.append(u'{0}{1} {2}={3}'.format(indent, field.type,
+                                                      field.name,
+                                                      field.value),
+                             source=field.source, offset=field.offset)
+                continue
+            lines.append(u'{0}{1}{2} {3}'.format(indent, field.type,
+                                                 field.size, field.name),
+                         source=field.source, offset=field.offset)
+            if '/' not in field.type or depth == 0 or \
+               field.type in expanding:
+                continue
+            sub_fields = self.get_message_fields(field.type)
+            if sub_fields:
+                self.expand_message(lines, sub_fields[0],
+                                    None if depth is None else depth - 1,
+                                    indent + u'  ', expanding + [field.type])
+
+    def run_glob(self, package_name, pattern):
+        u"""Document all types in the package matching the pattern
+        """
+        package = self.find_package(package_name)
+        if not package:
+            return []
+        with self.profile('read'):
+            type_dir, type_files \
+                = self.type_file.read_all(os.path.dirname(package.filename),
+                                          pattern, self._snapshot)
+        # a type file added or removed changes the directory
+        self.note_ros_dependency(('file', type_dir), get_file_state(type_dir))
+        if not type_files:
+            type_pattern = pattern + '.' + self.type_file.ext
+            self.state_machine.reporter.warning(
+                'cannot find files matching {0}'.format(
+                    os.path.join(type_dir, type_pattern)),
+                line=self.lineno)
+            return []
+        result = []
+        for type_name, file_path, file_content in type_files:
+            directive = self.__class__(self.name,
+                                       [package_name + '/' + type_name],
+                                       self.options, self.content,
+                                       self.lineno, self.content_offset,
+                                       self.block_text, self.state,
+                                       self.state_machine)
+            directive.preloaded = (package, file_path, file_content)
+            result.extend(ROSType.run(directive))
+        return result
+
     def run(self):
         self.name = self.name.replace('auto', '')
+        package_name, type_name = self.arguments[0].split('/', 1)
+        if '*' in type_name or '?' in type_name or '[' in type_name:
+            self.env = self.state.document.settings.env
+            return self.run_glob(package_name, type_name)
         return ROSType.run(self)
 
 
@@ -444,35 +957,6 @@ class ROSAutoAction(ROSActionBase, ROSAutoType):
     pass
 
 
-class ROSTypeLexer(RegexLexer):
-    name = 'ROSTYPE'
-    aliases = ['rostype']
-    filenames = ['*.msg', '*.srv', '*.action']
-
-    tokens = {
-        'common': [
-            (r'[ \t]+', Text),
-            (r'#.*$', Comment.Single),
-            (r'[\[\]]', Punctuation),
-            (r'=', Operator),
-            (r'\-?(\d+\.\d*|\.\d+)', Number.Float),
-            (r'\-?\d+', Number.Integer),
-            ],
-        'field': [
-            include('common'),
-            (r'\n', Text, '#pop'),
-            (r'\w+', Name.Property, '#pop'),
-        ],
-        'root': [
-            include('common'),
-            (r'\n', Text),
-            (r'---\n', Keyword),
-            (r'(string)(\s+)([a-zA-Z_]\w*)(\s*)(=)(\s*)(.*)(\s*\n)',
-             bygroups(Name.Builtin, Text,
-                      Name.Property, Text,
-                      Operator, Text,
-                      Literal.String, Text)),
-            ('(' + '|'.join(BUILTIN_TYPES) + ')', Name.Builtin, 'field'),
-            (r'[\w/]+', Name.Class, 'field'),
-        ],
-    }
+def clear_type_graph(app):
+    ROSAutoType._type_graph = {}
+    ROSAutoType._md5sums = {}
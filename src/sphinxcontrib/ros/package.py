@@ -10,12 +10,14 @@ u"""
 """
 from __future__ import print_function
 
+import os
+
 from docutils.parsers.rst import directives
 from docutils.statemachine import StringList
 from sphinx.locale import l_
 from sphinx.util.docfields import Field
 
-from .base import ROSObjectDescription, GroupedFieldNoArg
+from .base import ROSObjectDescription, DocFieldBuilder, GroupedFieldNoArg
 
 
 def default_formatter(value):
@@ -80,6 +82,21 @@ def format_attr(package, attr, formatter_name='default_formatter'):
         return StringList(field_content)
 
 
+def add_attr_fields(directive, builder, package, attr,
+                    formatter_name='default_formatter'):
+    u"""Add the fields format_attr writes to the builder as nodes
+    """
+    value = getattr(package, attr, None)
+    field_name = attr if not attr.endswith('s') else attr[:-1]
+    formatter = FORMATTERS[formatter_name]
+    if value:
+        values = value if attr.endswith('s') else [value]
+        for v in values:
+            body = StringList(formatter(v), source=package.filename)
+            builder.add_field(field_name, '', directive.parse_field_body(body),
+                              package.filename, 1)
+
+
 # http://www.ros.org/reps/rep-0127.html
 class ROSPackage(ROSObjectDescription):
     option_spec = {
@@ -133,7 +150,14 @@ class ROSAutoPackage(ROSPackage):
         package = self.find_package(package_name)
         if not package:
             return None
-        self.env.note_dependency(self.env.relfn2path(package.filename)[0])
+        package = self.get_manifest(package)
+        self.env.note_dependency(os.path.relpath(package.filename,
+                                                 self.env.srcdir))
+        # fields, built as nodes unless the content may continue them
+        build_nodes = self.env.config.ros_build_nodes and \
+            not (self.content and self.content[0].startswith(':'))
+        if build_nodes:
+            builder = DocFieldBuilder(self)
         content = StringList()
         for attr in self.env.config.ros_package_attrs:
             if attr in self.env.config.ros_package_attrs_formatter:
@@ -142,9 +166,16 @@ class ROSAutoPackage(ROSPackage):
                 formatter = 'depend_formatter'
             else:
                 formatter = self.attr_formatters.get(attr, 'default_formatter')
+            if build_nodes:
+                add_attr_fields(self, builder, package, attr, formatter)
+                continue
             field = format_attr(package, attr, formatter)
             if field:
                 content.extend(field)
+        if build_nodes:
+            field_list = builder.make_field_list()
+            self.head_nodes = [field_list] if field_list else []
+            return self.content
         content.items = [(source, 0) for source, line in content.items]
         if len(content) > 0:
             content.append(StringList([u'']))
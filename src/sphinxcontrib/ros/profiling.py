@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+u"""
+    sphinxcontrib.ros.profiling
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Timings and cache counters of the directives, enabled by ros_profile.
+
+    :copyright: Copyright 2015 by otamachan.
+    :license: BSD, see LICENSE for details.
+"""
+from __future__ import print_function
+
+import json
+import os
+
+REPORT_FILENAME = 'ros_profile.json'
+SUMMARY_SIZE = 10
+
+
+def new_stats():
+    u"""Return the statistics of a document
+
+    ``phases`` maps a phase to the seconds spent in it, ``objects`` maps an
+    object to the seconds spent by its directive and ``caches`` maps a
+    cache to the numbers of hits and misses.
+    """
+    return {'phases': {}, 'objects': {}, 'caches': {}}
+
+
+def clear_profile(app):
+    u"""Forget the statistics of the last build
+    """
+    if app.env is not None and 'ros' in app.env.domaindata:
+        app.env.domaindata['ros']['profile'].clear()
+
+
+def aggregate(profile):
+    u"""Aggregate the statistics of the documents into a report
+    """
+    phases = {}
+    objects = {}
+    caches = {}
+    documents = {}
+    for docname, stats in profile.items():
+        for phase, seconds in stats['phases'].items():
+            phases[phase] = phases.get(phase, 0.0) + seconds
+        for name, seconds in stats['objects'].items():
+            objects[name] = objects.get(name, 0.0) + seconds
+        for cache, (hits, misses) in stats['caches'].items():
+            counts = caches.setdefault(cache, [0, 0])
+            counts[0] += hits
+            counts[1] += misses
+        documents[docname] = sum(stats['objects'].values())
+    return {
+        'total': sum(documents.values()),
+        'phases': phases,
+        'caches': {cache: {'hits': hits, 'misses': misses}
+                   for cache, (hits, misses) in caches.items()},
+        'documents': sorted(documents.items(), key=lambda x: -x[1]),
+        'objects': sorted(objects.items(), key=lambda x: -x[1]),
+    }
+
+
+def write_profile(app, exception):
+    u"""Write the report and print the summary at the end of the build
+
+    The statistics collected by parallel readers have been merged into the
+    environment by then.
+    """
+    if exception is not None or not app.config.ros_profile:
+        return
+    report = aggregate(app.env.domaindata['ros']['profile'])
+    filename = os.path.join(app.outdir, REPORT_FILENAME)
+    with open(filename, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    app.info('ros profile: %.3f s in %d documents, written to %s'
+             % (report['total'], len(report['documents']), filename))
+    for phase, seconds in sorted(report['phases'].items()):
+        app.info('  phase %-16s %8.3f s' % (phase, seconds))
+    for cache, counts in sorted(report['caches'].items()):
+        app.info('  cache %-16s %6d hits %6d misses'
+                 % (cache, counts['hits'], counts['misses']))
+    app.info('  slowest documents:')
+    for docname, seconds in report['documents'][:SUMMARY_SIZE]:
+        app.info('    %8.3f s  %s' % (seconds, docname))
+    app.info('  slowest objects:')
+    for name, seconds in report['objects'][:SUMMARY_SIZE]:
+        app.info('    %8.3f s  %s' % (seconds, name))
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+u"""
+    sphinxcontrib.ros.snapshot
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Snapshot of the packages and of the parsed type files of workspaces,
+    written by ``sphinx-ros-index`` and read instead of crawling.
+
+    :copyright: Copyright 2015 by otamachan.
+    :license: BSD, see LICENSE for details.
+"""
+from __future__ import print_function
+
+import hashlib
+import os
+import pickle
+import sys
+
+from .base import ROSObjectDescription, get_file_state
+from .index import (PackageIndex, PackageEntry, MANIFEST_FILENAME,
+                    find_package_paths)
+from .message import (ROSMessageBase, ROSServiceBase, ROSActionBase,
+                      interface_key)
+
+SNAPSHOT_VERSION = 1  # bump when the parsed fields change
+TYPE_FILES = (ROSMessageBase.type_file, ROSServiceBase.type_file,
+              ROSActionBase.type_file)
+
+
+def get_digest(paths):
+    u"""Return the hash of the states of the files and directories
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update(repr((path, get_file_state(path))).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class Snapshot(object):
+    u"""Packages and parsed type files of package paths
+
+    The snapshot keeps the hash of the states of the manifests, the type
+    directories and the type files it has read, so that it can tell when
+    they have been changed since. A package added to the package paths is
+    not noticed, the snapshot has to be built again.
+    """
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.paths = []  # package paths, in order of precedence
+        self.exclude_patterns = ()
+        self.packages = {}  # name -> PackageEntry
+        self.manifests = {}  # manifest path -> parsed package
+        self.files = {}  # type file path -> lines
+        self.interfaces = {}  # interface key -> parsed fields
+        self.states = []  # paths of the files whose states are hashed
+        self.digest = None
+
+    def load(self):
+        u"""Read the snapshot, return False if it is missing or broken
+        """
+        try:
+            with open(self.filename, 'rb') as f:
+                version, data = pickle.load(f)
+        except Exception:
+            return False
+        if version != SNAPSHOT_VERSION:
+            return False
+        self.__dict__.update(data)
+        return True
+
+    def save(self):
+        data = dict(self.__dict__)
+        del data['filename']
+        dirname = os.path.dirname(self.filename)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'wb') as f:
+            pickle.dump((SNAPSHOT_VERSION, data), f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_filename, self.filename)
+
+    def is_stale(self):
+        u"""Return True if a file read by the snapshot has been changed
+        """
+        return get_digest(self.states) != self.digest
+
+    def build(self, paths, exclude_patterns=()):
+        u"""Crawl the package paths, the first one first, and parse them
+        """
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.exclude_patterns = tuple(exclude_patterns)
+        index = PackageIndex()
+        states = []
+        for base_abspath in self.paths:
+            for path in find_package_paths(base_abspath,
+                                           self.exclude_patterns):
+                manifest = os.path.normpath(os.path.join(
+                    base_abspath, path, MANIFEST_FILENAME))
+                package = index.get_package(manifest)
+                if package.name in self.packages:
+                    continue
+                states.append(manifest)
+                self.packages[package.name] = PackageEntry(package.name,
+                                                           manifest)
+                self.manifests[manifest] = package
+                states.extend(self.add_type_files(os.path.dirname(manifest),
+                                                  package.name))
+        self.states = sorted(states)
+        self.digest = get_digest(self.states)
+
+    def add_type_files(self, package_path, package_name):
+        u"""Read and parse the type files of the package
+
+        Returns the paths of the type directories and files.
+        """
+        paths = []
+        for type_file in TYPE_FILES:
+            type_dir, type_files = type_file.read_all(package_path, '*')
+            if os.path.isdir(type_dir):
+                paths.append(type_dir)
+            for _, file_path, file_content in type_files:
+                fields = type_file.parse(file_content, package_name)
+                # share the lines with the fields in the pickle
+                sources = [field.type_source
+                           for group in fields for field in group]
+                self.files[file_path] = sources[0].lines if sources \
+                    else tuple(file_content.data)
+                self.interfaces[interface_key(file_path,
+                                              file_content)] = fields
+                paths.append(file_path)
+        return paths
+
+
+def load_snapshot(app, filename):
+    u"""Load the snapshot given by ros_index_snapshot
+
+    It is ignored with a warning if it is missing or out of date.
+    """
+    snapshot = Snapshot(os.path.join(app.srcdir, filename))
+    if not snapshot.load():
+        app.warn('cannot read ros index snapshot %s' % snapshot.filename)
+    elif snapshot.is_stale():
+        app.warn('ros index snapshot %s is out of date, rebuild it with '
+                 'sphinx-ros-index' % snapshot.filename)
+    else:
+        ROSObjectDescription._snapshot = snapshot
+
+
+def main(argv=None):
+    u"""Entry point of sphinx-ros-index
+    """
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='sphinx-ros-index',
+        description='Build or check a snapshot of ROS packages for '
+                    'the ros_index_snapshot option of sphinxcontrib-ros')
+    subparsers = parser.add_subparsers(dest='command')
+    build_parser = subparsers.add_parser(
+        'build', help='crawl and parse the package paths, '
+                      'the first one taking precedence')
+    build_parser.add_argument('paths', nargs='+')
+    build_parser.add_argument('-o', '--output', default='index.db')
+    build_parser.add_argument('-x', '--exclude', action='append', default=[],
+                              help='glob pattern of directories not to walk')
+    check_parser = subparsers.add_parser(
+        'check', help='exit with 1 if the snapshot is out of date')
+    check_parser.add_argument('snapshot')
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        snapshot = Snapshot(args.output)
+        snapshot.build(args.paths, args.exclude)
+        snapshot.save()
+        print('%d packages and %d type files written to %s'
+              % (len(snapshot.packages), len(snapshot.files), args.output))
+        return 0
+    snapshot = Snapshot(args.snapshot)
+    if not snapshot.load():
+        print('cannot read %s' % args.snapshot, file=sys.stderr)
+        return 2
+    if snapshot.is_stale():
+        print('%s is out of date' % args.snapshot)
+        return 1
+    print('%s is up to date' % args.snapshot)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+u"""
+    sphinxcontrib.ros.storage
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    SQLite storage of the data of the ROS domain, enabled by ros_storage.
+
+    :copyright: Copyright 2015 by otamachan.
+    :license: BSD, see LICENSE for details.
+"""
+from __future__ import print_function
+
+import json
+import os
+import pickle
+import sqlite3
+import uuid
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+STORAGE_FILENAME = 'ros_domain.sqlite'
+STORAGE_VERSION = 1  # bump when the tables change
+
+
+class SQLiteMapping(MutableMapping):
+    u"""Dict kept in a table of the storage
+
+    The keys are stored as JSON, so that equal keys of str and unicode
+    match, along with the pickled keys and values. Only the rows looked up
+    are loaded. The changes are kept in memory until they are flushed into
+    the transaction of the storage, so that the mapping can be pickled with
+    them to hand them over from a parallel reader.
+
+    The values of a mutable table may be changed in place, e.g. the sets
+    returned by ``setdefault``: the values looked up are kept until they
+    are flushed and written back if they have been changed. The values
+    yielded by ``items`` and ``values`` are copies.
+    """
+    def __init__(self, storage, table, mutable=False):
+        self.storage = storage
+        self.table = table
+        self.mutable = mutable
+        self.generation = storage.generation
+        # key text -> (key, value), or None if deleted
+        self.pending = {}
+        # key text -> (key, value, pickled value) of mutable values
+        self.loaded = {}
+
+    def __getstate__(self):
+        self.collect()
+        return {'filename': self.storage.filename, 'table': self.table,
+                'mutable': self.mutable, 'generation': self.generation,
+                'pending': self.pending}
+
+    def __setstate__(self, state):
+        self.storage = get_storage(state['filename'])
+        self.table = state['table']
+        self.mutable = state['mutable']
+        self.generation = state['generation']
+        self.pending = state['pending']
+        self.loaded = {}
+
+    @staticmethod
+    def get_text(key):
+        return json.dumps(key, separators=(',', ':'))
+
+    def get_tag(self, key):
+        u"""Return the indexed tag of the key, see :meth:`find_tagged`
+        """
+        return None
+
+    def query(self, sql, parameters=()):
+        return self.storage.execute(sql.format(table=self.table), parameters)
+
+    def __getitem__(self, key):
+        text = self.get_text(key)
+        if text in self.pending:
+            item = self.pending[text]
+            if item is None:
+                raise KeyError(key)
+            return item[1]
+        if text in self.loaded:
+            return self.loaded[text][1]
+        row = self.query('SELECT value FROM "{table}" WHERE key = ?',
+                         (text,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        value = pickle.loads(bytes(row[0]))
+        if self.mutable:
+            self.loaded[text] = (key, value, bytes(row[0]))
+        return value
+
+    def __contains__(self, key):
+        text = self.get_text(key)
+        if text in self.pending:
+            return self.pending[text] is not None
+        if text in self.loaded:
+            return True
+        return self.query('SELECT 1 FROM "{table}" WHERE key = ?',
+                          (text,)).fetchone() is not None
+
+    def __setitem__(self, key, value):
+        text = self.get_text(key)
+        self.loaded.pop(text, None)
+        self.pending[text] = (key, value)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        text = self.get_text(key)
+        self.loaded.pop(text, None)
+        self.pending[text] = None
+
+    def __iter__(self):
+        for text, key in self.query('SELECT key, pkey FROM "{table}"'):
+            if text not in self.pending:
+                yield pickle.loads(bytes(key))
+        for item in list(self.pending.values()):
+            if item is not None:
+                yield item[0]
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def items(self):
+        items = []
+        for text, key, value in self.query(
+                'SELECT key, pkey, value FROM "{table}"'):
+            if text in self.pending:
+                continue
+            if text in self.loaded:
+                items.append(self.loaded[text][:2])
+            else:
+                items.append((pickle.loads(bytes(key)),
+                              pickle.loads(bytes(value))))
+        items.extend(item for item in self.pending.values()
+                     if item is not None)
+        return items
+
+    def values(self):
+        return [value for _, value in self.items()]
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def update(self, *args, **kwargs):
+        if len(args) == 1 and not kwargs and \
+           isinstance(args[0], SQLiteMapping) and \
+           args[0].table == self.table and \
+           args[0].storage.filename == self.storage.filename:
+            # the rows in the storage are the same, take only the changes
+            other = args[0]
+            other.collect()
+            for text, item in other.pending.items():
+                self.loaded.pop(text, None)
+                self.pending[text] = item
+            return
+        MutableMapping.update(self, *args, **kwargs)
+
+    def collect(self):
+        u"""Move the mutable values changed in place to the changes
+        """
+        for text, (key, value, data) in list(self.loaded.items()):
+            if pickle.dumps(value, pickle.HIGHEST_PROTOCOL) != data:
+                self.pending[text] = (key, value)
+                del self.loaded[text]
+
+    def flush(self):
+        u"""Write the changes into the transaction of the storage
+
+        Returns True if anything has been written.
+        """
+        self.collect()
+        self.loaded.clear()
+        if not self.pending:
+            return False
+        deleted = [(text,) for text, item in self.pending.items()
+                   if item is None]
+        changed = [(text, self.get_tag(item[0]),
+                    sqlite3.Binary(pickle.dumps(item[0],
+                                                pickle.HIGHEST_PROTOCOL)),
+                    sqlite3.Binary(pickle.dumps(item[1],
+                                                pickle.HIGHEST_PROTOCOL)))
+                   for text, item in self.pending.items()
+                   if item is not None]
+        self.storage.executemany(
+            'DELETE FROM "{0}" WHERE key = ?'.format(self.table), deleted)
+        self.storage.executemany(
+            'INSERT OR REPLACE INTO "{0}" (key, tag, pkey, value) '
+            'VALUES (?, ?, ?, ?)'.format(self.table), changed)
+        self.pending.clear()
+        return True
+
+    def find_tagged(self, tag):
+        u"""Return the sorted keys of the tag
+        """
+        keys = [pickle.loads(bytes(key)) for text, key in self.query(
+            'SELECT key, pkey FROM "{table}" WHERE tag = ?', (tag,))
+            if text not in self.pending]
+        keys.extend(item[0] for item in self.pending.values()
+                    if item is not None and self.get_tag(item[0]) == tag)
+        return sorted(keys)
+
+
+class ObjectMapping(SQLiteMapping):
+    u"""Objects tagged by their short names
+    """
+    def get_tag(self, key):
+        return key[1].rsplit('/', 1)[-1]
+
+
+class ShortNames(object):
+    u"""Short names of the objects looked up in the storage
+    """
+    def __init__(self, objects):
+        self.objects = objects
+
+    def get(self, short_name, default=None):
+        return self.objects.find_tagged(short_name) or default
+
+
+# the tables of the domain data kept in the storage and whether their
+# values are changed in place
+TABLES = (
+    ('objects', ObjectMapping, False),
+    ('docobjects', SQLiteMapping, True),
+    ('interfaces', SQLiteMapping, False),
+    ('interface_keys', SQLiteMapping, True),
+    ('definitions', SQLiteMapping, False),
+    ('dependencies', SQLiteMapping, True),
+)
+
+
+class Storage(object):
+    u"""SQLite file of the tables of the domain data
+
+    The changes of the mappings are written in one transaction, which is
+    committed at the end of reading the documents. Each commit changes the
+    generation of the storage, which the mappings pickled with the
+    environment remember, so that an environment which does not match the
+    storage is not used.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.connection = None
+        self.pid = None  # process of the connection
+        self.owner = os.getpid()  # process writing into the file
+        self.mappings = []  # mappings whose changes are committed
+        self.connect()
+        self.generation = self.get_meta('generation')
+        if self.get_meta('version') != str(STORAGE_VERSION):
+            self.reset()
+
+    def connect(self):
+        dirname = os.path.dirname(self.filename)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        self.connection = sqlite3.connect(self.filename)
+        self.pid = os.getpid()
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS meta '
+                                    '(key TEXT PRIMARY KEY, value TEXT)')
+            for table, _, _ in TABLES:
+                self.connection.execute(
+                    'CREATE TABLE IF NOT EXISTS "{0}" (key TEXT PRIMARY KEY, '
+                    'tag TEXT, pkey BLOB, value BLOB)'.format(table))
+                self.connection.execute(
+                    'CREATE INDEX IF NOT EXISTS "{0}_tag" ON "{0}" (tag)'
+                    .format(table))
+
+    def get_connection(self):
+        if self.pid != os.getpid():
+            # a connection must not be used across fork
+            self.connect()
+        return self.connection
+
+    def execute(self, sql, parameters=()):
+        return self.get_connection().execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return self.get_connection().executemany(sql, parameters)
+
+    def get_meta(self, key):
+        row = self.execute('SELECT value FROM meta WHERE key = ?',
+                           (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self.execute('INSERT OR REPLACE INTO meta (key, value) '
+                     'VALUES (?, ?)', (key, value))
+
+    def reset(self):
+        u"""Empty the tables for a new environment
+        """
+        connection = self.get_connection()
+        connection.rollback()
+        with connection:
+            for table, _, _ in TABLES:
+                connection.execute('DELETE FROM "{0}"'.format(table))
+            self.generation = uuid.uuid4().hex
+            self.set_meta('version', str(STORAGE_VERSION))
+            self.set_meta('generation', self.generation)
+        self.mappings = []
+
+    def open(self, data):
+        u"""Put the mappings of the tables into the domain data
+        """
+        self.reset()
+        for table, cls, mutable in TABLES:
+            data[table] = cls(self, table, mutable)
+        self.mappings = [data[table] for table, _, _ in TABLES]
+
+    def attach(self, data):
+        u"""Commit the changes of the mappings of the domain data
+
+        Returns False if they do not match the storage.
+        """
+        mappings = [data.get(table) for table, _, _ in TABLES]
+        if not all(isinstance(mapping, SQLiteMapping) and
+                   mapping.storage is self and
+                   mapping.generation == self.generation
+                   for mapping in mappings):
+            return False
+        self.mappings = mappings
+        return True
+
+    def flush(self):
+        u"""Write the changes of the mappings into the transaction
+
+        Only the process which has opened the storage writes into it, the
+        parallel readers hand their changes over with the mappings.
+        """
+        if self.owner != os.getpid():
+            return False
+        changed = False
+        for mapping in self.mappings:
+            changed = mapping.flush() or changed
+        return changed
+
+    def commit(self):
+        u"""Commit the changes of the mappings with a new generation
+        """
+        changed = self.flush()
+        if changed:
+            self.generation = uuid.uuid4().hex
+            self.set_meta('generation', self.generation)
+            for mapping in self.mappings:
+                mapping.generation = self.generation
+        self.get_connection().commit()
+
+
+_storages = {}  # filename -> Storage
+
+
+def get_storage(filename):
+    u"""Return the storage of the file, opened once per process
+    """
+    storage = _storages.get(filename)
+    if storage is None:
+        storage = _storages[filename] = Storage(filename)
+    return storage
+
+
+def get_data_storage(data):
+    u"""Return the storage of the domain data or None if it is in memory
+    """
+    objects = data.get('objects')
+    if isinstance(objects, SQLiteMapping):
+        return objects.storage
+    return None
+
+
+def init_storage(env, data, new):
+    u"""Set up the domain data, new or read with the environment, as
+    ros_storage asks
+
+    Returns False if the data read with the environment is in another
+    storage or does not match the storage anymore.
+    """
+    if env.config.ros_storage not in (None, 'sqlite'):
+        raise ValueError('unknown ros_storage %r' % env.config.ros_storage)
+    filename = os.path.join(env.doctreedir, STORAGE_FILENAME)
+    storage = get_data_storage(data)
+    if env.config.ros_storage == 'sqlite':
+        if new:
+            get_storage(filename).open(data)
+            return True
+        return storage is not None and storage.filename == filename and \
+            storage.attach(data)
+    return storage is None
+
+
+def switch_storage(app, env, docnames):
+    u"""Move the domain data into the storage ros_storage asks for
+
+    The environment is read with the config of the last build, so the
+    domain data is checked against ros_storage again once the config has
+    been updated. As ros_storage has changed then, all the documents are
+    read again into empty tables.
+    """
+    data = env.domaindata['ros']
+    if init_storage(env, data, False):
+        return
+    for table, _, _ in TABLES:
+        data[table] = {}
+    init_storage(env, data, True)
+
+
+def flush_storage(app, doctree):
+    u"""Write the changes made while reading the document
+    """
+    storage = get_data_storage(app.env.domaindata['ros'])
+    if storage is not None:
+        storage.flush()
+
+
+def commit_storage(app, env):
+    u"""Commit the changes made while reading the documents
+    """
+    storage = get_data_storage(env.domaindata['ros'])
+    if storage is not None:
+        storage.commit()
@@ -0,0 +1,8 @@
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + '/../../../src'))
+import sphinxcontrib; reload(sphinxcontrib)
+master_doc = 'index'
+extensions = ['sphinxcontrib.ros']
+ros_base_path = []
+ros_prefix_path = ['../../packages/ament_prefix',
+                   '../../packages/catkin_prefix']
@@ -0,0 +1,7 @@
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + '/../../../src'))
+import sphinxcontrib; reload(sphinxcontrib)
+master_doc = 'index'
+extensions = ['sphinxcontrib.ros']
+ros_base_path = ['../../packages/nested_base']
+ros_package_path = []
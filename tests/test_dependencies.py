@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os
+import unittest
+from sphinx.util.console import strip_colors
+from sphinx_testing import TestApp
+
+
+class TestDependencies(unittest.TestCase):
+    def setUp(self):
+        self.app = TestApp(buildername='text',
+                           srcdir='tests/doc/dependencies',
+                           copy_srcdir_to_tmpdir=True)
+        self.app.build()
+        self.packages = os.path.join(self.app.srcdir, 'packages')
+
+    def tearDown(self):
+        self.app.cleanup()
+
+    def rebuild(self):
+        app = TestApp(buildername='text', srcdir=self.app.srcdir,
+                      outdir=self.app.outdir,
+                      doctreedir=self.app.doctreedir)
+        try:
+            app.build()
+        finally:
+            app.cleanup()
+        return strip_colors(app._status.getvalue())
+
+    def get_outdated_docs(self):
+        from sphinxcontrib.ros.base import (init_package_index,
+                                            get_outdated_docs)
+        init_package_index(self.app)
+        return sorted(get_outdated_docs(self.app, self.app.env,
+                                        set(), set(), set()))
+
+    def test_type_file(self):
+        self.assertIn('0 added, 0 changed, 0 removed', self.rebuild())
+        # only the document expanding the field type depends on its file
+        with open(os.path.join(self.packages, 'dep_msgs', 'msg',
+                               'Inner.msg'), 'a') as f:
+            f.write('float64 y\n')
+        status = self.rebuild()
+        self.assertIn('0 added, 1 changed, 0 removed', status)
+        self.assertIn('reading sources... [100%] expand ', status)
+        self.assertIn('float64 y',
+                      (self.app.outdir / 'expand.txt').read_text())
+
+    def test_unchanged(self):
+        self.assertEqual(self.get_outdated_docs(), [])
+
+    def test_added_manifest(self):
+        # the package the document could not find appears
+        os.makedirs(os.path.join(self.packages, 'new', 'new_msgs'))
+        with open(os.path.join(self.packages, 'new', 'new_msgs',
+                               'package.xml'), 'w') as f:
+            f.write('<package><name>new_msgs</name></package>')
+        self.assertEqual(self.get_outdated_docs(), ['missing'])
+
+    def test_moved_manifest(self):
+        os.makedirs(os.path.join(self.packages, 'moved'))
+        os.rename(os.path.join(self.packages, 'dep_msgs'),
+                  os.path.join(self.packages, 'moved', 'dep_msgs'))
+        self.assertEqual(self.get_outdated_docs(), ['expand', 'plain'])
+
+    def test_removed_manifest(self):
+        os.remove(os.path.join(self.packages, 'other_msgs', 'package.xml'))
+        self.assertEqual(self.get_outdated_docs(), ['other'])
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import unittest
+from sphinx_testing import TestApp
+
+
+class TestExpand(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = TestApp(buildername='text',
+                          srcdir='tests/doc/message_expand')
+        cls.app.build()
+        cls.text = (cls.app.outdir / 'index.txt').read_text()
+
+    def test_nested(self):
+        self.assertIn('      geometry_msgs/PoseStamped[] poses\n'
+                      '        std_msgs/Header header\n'
+                      '          uint32 seq\n'
+                      '          time stamp\n'
+                      '          string frame_id\n'
+                      '        geometry_msgs/Pose pose\n'
+                      '          geometry_msgs/Point position\n'
+                      '            float64 x\n', self.text)
+
+    def test_constant(self):
+        self.assertIn('      uint8 MODE_LINEAR=0\n', self.text)
+
+    def test_depth(self):
+        self.assertIn('      geometry_msgs/Pose pose\n'
+                      '        geometry_msgs/Point position\n'
+                      '        geometry_msgs/Quaternion orientation\n',
+                      self.text)
+
+    def test_recursive(self):
+        self.assertIn('      nested_msgs/Tree[] children\n', self.text)
+
+    def test_md5sum(self):
+        for md5sum in ['4a842b65f413084dc2b10fb484ea7f17',  # Point
+                       'e45d45a5a1ce597b249e23fb30fc871f',  # Pose
+                       'd3812c3cbc69362b77dc0b19b345f8f5']:  # PoseStamped
+            self.assertIn('   MD5Sum:\n      ' + md5sum + '\n', self.text)
+
+    def test_definition(self):
+        self.assertIn('      uint8 mode\n\n'
+                      '      ' + '=' * 80 + '\n'
+                      '      MSG: std_msgs/Header\n', self.text)
+        self.assertIn('      MSG: geometry_msgs/PoseStamped\n', self.text)
+        # Header is listed only once
+        self.assertEqual(self.text.count('MSG: std_msgs/Header'), 1)
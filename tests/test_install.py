@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import unittest
+from sphinx_testing import TestApp
+
+
+class TestInstallPrefix(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = TestApp(buildername='singlehtml',
+                          srcdir='tests/doc/install_prefix')
+        cls.app.build()
+        cls.html = (cls.app.outdir / 'index.html').read_text()
+
+    def test_ament(self):
+        self.assertIn('id="package-installed_msgs"', self.html)
+        self.assertIn('id="message-installed_msgs/Installed"', self.html)
+
+    def test_catkin(self):
+        self.assertIn('id="message-catkin_msgs/Installed"', self.html)
+
+    def test_not_in_ament_index(self):
+        self.assertIn('cannot find package stale_msgs',
+                      self.app._warning.getvalue())
+
+
+class TestOverlay(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = TestApp(buildername='text',
+                          srcdir='tests/doc/install_prefix',
+                          confoverrides={'ros_base_path':
+                                         ['../../packages/overlay_base']})
+        cls.app.build()
+        cls.text = (cls.app.outdir / 'index.txt').read_text()
+
+    def test_workspace_first(self):
+        # the package of the workspace overlays the installed one
+        self.assertIn('catkin_msgs/Installed\n\n   Field:\n'
+                      '      * **workspace_data** (*string*)', self.text)
+        # the other packages are still found in the prefixes
+        self.assertIn('installed_msgs/Installed', self.text)
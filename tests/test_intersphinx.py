@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import unittest
+from sphinx.ext.intersphinx import read_inventory_v2
+from sphinx_testing import TestApp
+
+
+class TestIntersphinx(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.xref_app = TestApp(buildername='html', srcdir='tests/doc/xref')
+        cls.xref_app.build()
+        cls.inventory_uri = str(cls.xref_app.outdir)
+        cls.app = TestApp(buildername='html',
+                          srcdir='tests/doc/intersphinx',
+                          confoverrides={'intersphinx_mapping': {
+                              'xref': (cls.inventory_uri, None)}})
+        cls.app.build()
+        cls.html = (cls.app.outdir / 'index.html').read_text()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app.cleanup()
+        cls.xref_app.cleanup()
+
+    def test_inventory(self):
+        with open(self.xref_app.outdir / 'objects.inv', 'rb') as f:
+            f.readline()
+            inventory = read_inventory_v2(f, '', lambda a, b: b)
+        self.assertEqual(inventory['ros:message']['pkg_b/Point'][2],
+                         'index.html#message-pkg_b/Point')
+        self.assertEqual(sorted(inventory['ros:message']),
+                         ['pkg_a/Point', 'pkg_a/Pose', 'pkg_b/Point',
+                          'pkg_c/PoseStamped'])
+
+    def get_href(self, name):
+        return ('href="%s/index.html#message-%s"'
+                % (self.inventory_uri, name))
+
+    def test_qualified(self):
+        self.assertIn(self.get_href('pkg_b/Point'), self.html)
+
+    def test_package_relative(self):
+        # Point in pkg_a/Polygon is pkg_a/Point of the other project
+        self.assertIn(self.get_href('pkg_a/Point'), self.html)
+        self.assertNotIn("more than one target found for cross-reference "
+                         "u'Point'", self.app._warning.getvalue())
+
+    def test_short_name(self):
+        self.assertIn(self.get_href('pkg_a/Pose'), self.html)
+
+    def test_local_first(self):
+        self.assertNotIn(self.get_href('pkg_c/PoseStamped'), self.html)
+        self.assertIn('href="#message-pkg_c/PoseStamped"', self.html)
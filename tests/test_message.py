@@ -15,6 +15,15 @@ class TestMessage(unittest.TestCase):
     def test(self):
         pass
 
+    def test_interface_cache(self):
+        data = self.app.env.domaindata['ros']
+        self.assertEqual(len(data['interfaces']), 2)
+        self.assertEqual(list(data['interface_keys']), ['index'])
+
+    def test_glob(self):
+        html = (self.app.outdir / 'index.html').read_text()
+        self.assertIn('package_1/Message1', html)
+
 
 class TestMessageCustomizedConf(unittest.TestCase):
     @classmethod
@@ -25,3 +34,15 @@ class TestMessageCustomizedConf(unittest.TestCase):
 
     def test(self):
         pass
+
+    def test_rst_fields(self):
+        # the fields made as nodes look like the ones parsed from rST
+        app = TestApp(buildername='singlehtml',
+                      srcdir='tests/doc/message_customized_conf',
+                      confoverrides={'ros_build_nodes': False})
+        try:
+            app.build()
+            self.assertEqual((app.outdir / 'index.html').read_text(),
+                             (self.app.outdir / 'index.html').read_text())
+        finally:
+            app.cleanup()
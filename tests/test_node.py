@@ -14,3 +14,10 @@ class TestNode(unittest.TestCase):
 
     def test(self):
         pass
+
+    def test_merge_fields(self):
+        # the default values are merged into the parameters
+        html = (self.app.outdir / 'index.html').read_text()
+        self.assertIn('(default: <code', html)
+        self.assertNotIn('Parameters Default Value', html)
+        self.assertNotIn('Parameters Set Default Value', html)
@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function
 
+import os
+import shutil
+import tempfile
 import unittest
+from sphinx.util.console import strip_colors
 from sphinx_testing import TestApp
 
 
@@ -15,6 +19,36 @@ class TestPackage(unittest.TestCase):
     def test(self):
         pass
 
+    def test_package_index(self):
+        from sphinxcontrib.ros.index import PackageIndex, INDEX_FILENAME
+        index_filename = os.path.join(self.app.doctreedir, INDEX_FILENAME)
+        index = PackageIndex(index_filename)
+        names = [entry[2] for entry in index.entries.values()]
+        self.assertIn('package_1', names)
+        # the manifests of the packages documented are parsed fully
+        packages = [entry[3].name for entry in index.entries.values()
+                    if entry[3] is not None]
+        self.assertIn('package_1', packages)
+
+    def test_crawl_names(self):
+        from sphinxcontrib.ros.index import PackageIndex
+        index = PackageIndex()
+        packages = index.find_packages(os.path.abspath(
+            'tests/packages/nested_base'))
+        self.assertEqual(sorted(packages),
+                         ['geometry_msgs', 'nested_msgs', 'std_msgs'])
+        # only the names are read
+        self.assertEqual([entry[3] for entry in index.entries.values()],
+                         [None, None, None])
+        manifest = packages['std_msgs'].filename
+        self.assertEqual(index.get_package(manifest).name, 'std_msgs')
+        self.assertIsNotNone(index.entries[manifest][3])
+
+    def test_dependencies(self):
+        dependencies = self.app.env.domaindata['ros']['dependencies']
+        self.assertIsNone(dependencies['index'][
+            ('package', None, 'package_not_exist')])
+
 
 class TestPackageCustomizedConf(unittest.TestCase):
     @classmethod
@@ -25,3 +59,193 @@ class TestPackageCustomizedConf(unittest.TestCase):
 
     def test(self):
         pass
+
+
+class TestFindPackagePaths(unittest.TestCase):
+    def setUp(self):
+        self.base = tempfile.mkdtemp()
+        for path in ['src/pkg_a', 'src/pkg_a/nested', 'src/group/pkg_b',
+                     'src/ignored/pkg_c', 'install/share/pkg_a',
+                     'build/pkg_d', '.hidden/pkg_e', 'log']:
+            os.makedirs(os.path.join(self.base, path))
+            open(os.path.join(self.base, path, 'package.xml'), 'w').close()
+        open(os.path.join(self.base, 'src/ignored/COLCON_IGNORE'),
+             'w').close()
+        open(os.path.join(self.base, 'build/AMENT_IGNORE'), 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.base)
+
+    def test(self):
+        from sphinxcontrib.ros.index import find_package_paths
+        self.assertEqual(find_package_paths(self.base, ['install', 'log']),
+                         ['src/group/pkg_b', 'src/pkg_a'])
+        self.assertEqual(find_package_paths(self.base),
+                         ['install/share/pkg_a', 'log', 'src/group/pkg_b',
+                          'src/pkg_a'])
+        self.assertEqual(find_package_paths(self.base, ['src/g*']),
+                         ['install/share/pkg_a', 'log', 'src/pkg_a'])
+        self.assertEqual(find_package_paths(os.path.join(self.base, 'log')),
+                         ['.'])
+
+
+class TestCrawlNestedPaths(unittest.TestCase):
+    def setUp(self):
+        self.base = tempfile.mkdtemp()
+        for name in ['pkg_a', 'pkg_b', 'pkg_c']:
+            os.makedirs(os.path.join(self.base, 'src', name))
+            with open(os.path.join(self.base, 'src', name, 'package.xml'),
+                      'w') as f:
+                f.write('<package><name>%s</name></package>' % name)
+
+    def tearDown(self):
+        shutil.rmtree(self.base)
+
+    def test_removed_package(self):
+        from sphinxcontrib.ros.index import PackageIndex
+        paths = [self.base, os.path.join(self.base, 'src')]
+        index = PackageIndex()
+        index.find_all_packages(paths)
+        self.assertEqual(len(index.entries), 3)
+        self.assertEqual(sorted(index.crawled[paths[1]]),
+                         ['pkg_a', 'pkg_b', 'pkg_c'])
+        # both paths have the stale manifest of the removed package
+        shutil.rmtree(os.path.join(self.base, 'src', 'pkg_b'))
+        index.crawled.clear()
+        index.modified = False
+        index.find_all_packages(paths)
+        for path in paths:
+            self.assertEqual(sorted(index.crawled[path]), ['pkg_a', 'pkg_c'])
+        self.assertEqual(sorted(entry[2] for entry in index.entries.values()),
+                         ['pkg_a', 'pkg_c'])
+        self.assertTrue(index.modified)
+
+    def test_saved_walk(self):
+        from sphinxcontrib.ros.index import PackageIndex
+        doctreedir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, doctreedir)
+        filename = os.path.join(doctreedir, 'ros_packages.pickle')
+        index = PackageIndex(filename)
+        index.find_packages(self.base)
+        index.save()
+        # the walk is reused as long as no directory has been changed
+        index = PackageIndex(filename)
+        walk = index.walks[self.base]
+        self.assertEqual(sorted(index.find_packages(self.base)),
+                         ['pkg_a', 'pkg_b', 'pkg_c'])
+        self.assertIs(index.walks[self.base], walk)
+        self.assertFalse(index.modified)
+        os.makedirs(os.path.join(self.base, 'src', 'pkg_d'))
+        with open(os.path.join(self.base, 'src', 'pkg_d', 'package.xml'),
+                  'w') as f:
+            f.write('<package><name>pkg_d</name></package>')
+        index = PackageIndex(filename)
+        self.assertEqual(sorted(index.find_packages(self.base)),
+                         ['pkg_a', 'pkg_b', 'pkg_c', 'pkg_d'])
+        self.assertIsNot(index.walks[self.base], walk)
+
+
+class TestProbe(unittest.TestCase):
+    def setUp(self):
+        self.base = tempfile.mkdtemp()
+        for name in ['pkg_a', 'pkg_ignored', 'pkg_excluded', '.pkg_hidden']:
+            os.makedirs(os.path.join(self.base, name))
+            with open(os.path.join(self.base, name, 'package.xml'),
+                      'w') as f:
+                f.write('<package><name>%s</name></package>' % name)
+        open(os.path.join(self.base, 'pkg_ignored', 'CATKIN_IGNORE'),
+             'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.base)
+
+    def test_skipped(self):
+        from sphinxcontrib.ros.index import PackageIndex
+        index = PackageIndex()
+        index.exclude_patterns = ('*_excluded',)
+        # the packages the crawl skips are not found by probing either
+        self.assertEqual(sorted(index.find_packages(self.base)), ['pkg_a'])
+        for name in ['pkg_ignored', 'pkg_excluded', '.pkg_hidden']:
+            self.assertIsNone(index.probe(self.base, name))
+        self.assertEqual(index.probe(self.base, 'pkg_a').filename,
+                         os.path.join(self.base, 'pkg_a', 'package.xml'))
+        open(os.path.join(self.base, 'COLCON_IGNORE'), 'w').close()
+        self.assertIsNone(index.probe(self.base, 'pkg_a'))
+
+
+class TestRosPackagePath(unittest.TestCase):
+    @classmethod
+    def build(cls, confoverrides):
+        from sphinxcontrib.ros.base import ROSObjectDescription
+        environ = os.environ.copy()
+        os.environ['ROS_PACKAGE_PATH'] = os.pathsep.join(
+            [os.path.abspath('tests/packages/not_exist'),
+             os.path.abspath('tests/packages/nested_base')])
+        confoverrides['ros_base_path'] = []
+        try:
+            app = TestApp(buildername='text',
+                          srcdir='tests/doc/message_expand',
+                          confoverrides=confoverrides)
+            app.build()
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+        return (app, dict(ROSObjectDescription._package_index.crawled),
+                dict(ROSObjectDescription._ros_lookups))
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app, cls.crawled, cls.lookups = cls.build(
+            {'ros_use_env_package_path': True})
+
+    def test_probe(self):
+        self.assertEqual(self.app._warning.getvalue(), '')
+        self.assertEqual(
+            self.lookups['std_msgs'].filename,
+            os.path.abspath('tests/packages/nested_base/std_msgs/package.xml'))
+        # found without crawling ROS_PACKAGE_PATH, the base path is
+        # searched first
+        self.assertEqual(list(self.crawled),
+                         [os.path.abspath(self.app.srcdir)])
+
+    def test_unset(self):
+        # ROS_PACKAGE_PATH is neither probed nor crawled unless asked for
+        app, crawled, lookups = self.build({})
+        self.assertIsNone(lookups['nested_msgs'])
+        self.assertEqual(list(crawled), [os.path.abspath(app.srcdir)])
+
+
+class TestParallelRead(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from sphinxcontrib.ros.base import ROSObjectDescription
+        cls.app = TestApp(buildername='text',
+                          srcdir='tests/doc/parallel_read', parallel=2)
+        cls.app.build()
+        cls.index = ROSObjectDescription._package_index
+        cls.ros_packages = dict(ROSObjectDescription._ros_packages)
+
+    def test(self):
+        self.assertIn('waiting for workers',
+                      strip_colors(self.app._status.getvalue()))
+        self.assertEqual(self.app._warning.getvalue(), '')
+
+    def test_main_process_crawl(self):
+        # the documents read for the first time make the main process
+        # crawl the package paths before the readers are forked
+        self.assertEqual(sorted(self.ros_packages),
+                         ['geometry_msgs', 'nested_msgs', 'std_msgs'])
+
+    def test_base_crawl(self):
+        # the crawl of :base: in a reader is handed back to the main process
+        from sphinxcontrib.ros.index import PackageIndex, INDEX_FILENAME
+        base = os.path.abspath('tests/packages/another_base')
+        self.assertEqual(list(self.index.crawled[base]),
+                         ['package_1_under_another_base'])
+        index = PackageIndex(os.path.join(self.app.doctreedir,
+                                          INDEX_FILENAME))
+        self.assertIn(base, index.walks)
+        manifest = os.path.join(base, 'package_1_under_another_base',
+                                'package.xml')
+        self.assertEqual(index.entries[manifest][2],
+                         'package_1_under_another_base')
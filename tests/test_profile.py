@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import json
+import unittest
+from sphinx_testing import TestApp
+
+
+class TestProfile(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = TestApp(buildername='singlehtml',
+                          srcdir='tests/doc/message_expand',
+                          confoverrides={'ros_profile': True})
+        cls.app.build()
+        with open(cls.app.outdir / 'ros_profile.json') as f:
+            cls.report = json.load(f)
+
+    def test_report(self):
+        self.assertEqual([docname for docname, _ in
+                          self.report['documents']], ['index'])
+        self.assertIn('message nested_msgs/Path',
+                      [name for name, _ in self.report['objects']])
+        for phase in ('find_package', 'read', 'parse', 'make_docfields',
+                      'merge'):
+            self.assertIn(phase, self.report['phases'])
+
+    def test_caches(self):
+        # the second automessage of Path reuses the parsed interface
+        self.assertGreater(self.report['caches']['interfaces']['hits'], 0)
+        self.assertGreater(self.report['caches']['type_graph']['hits'], 0)
+
+    def test_summary(self):
+        self.assertIn('slowest documents', self.app._status.getvalue())
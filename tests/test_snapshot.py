@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+from sphinx_testing import TestApp
+
+
+class TestSnapshot(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from sphinxcontrib.ros.snapshot import main
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.filename = os.path.join(cls.tmpdir, 'index.db')
+        main(['build', 'tests/packages/nested_base', '-o', cls.filename])
+        cls.app = TestApp(buildername='singlehtml',
+                          srcdir='tests/doc/message_expand')
+        cls.app.build()
+        # no package can be found but in the snapshot
+        cls.snapshot_app = TestApp(buildername='singlehtml',
+                                   srcdir='tests/doc/message_expand',
+                                   confoverrides={
+                                       'ros_base_path': [],
+                                       'ros_package_path': [],
+                                       'ros_index_snapshot': cls.filename})
+        cls.snapshot_app.build()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.snapshot_app.cleanup()
+        cls.app.cleanup()
+        shutil.rmtree(cls.tmpdir)
+
+    def test_snapshot(self):
+        from sphinxcontrib.ros.snapshot import Snapshot, main
+        snapshot = Snapshot(self.filename)
+        self.assertTrue(snapshot.load())
+        self.assertEqual(sorted(snapshot.packages),
+                         ['geometry_msgs', 'nested_msgs', 'std_msgs'])
+        self.assertEqual(len(snapshot.files), len(snapshot.interfaces))
+        self.assertFalse(snapshot.is_stale())
+        self.assertEqual(main(['check', self.filename]), 0)
+
+    def test_build(self):
+        self.assertEqual(self.snapshot_app._warning.getvalue(), '')
+        self.assertEqual(
+            (self.snapshot_app.outdir / 'index.html').read_text(),
+            (self.app.outdir / 'index.html').read_text())
+
+    def test_command(self):
+        from sphinxcontrib.ros.snapshot import main
+        filename = os.path.join(self.tmpdir, 'new', 'dir', 'index.db')
+        self.assertEqual(main(['build', 'tests/packages/nested_base',
+                               '-o', filename]), 0)
+        self.assertEqual(main(['check', filename]), 0)
+        self.assertEqual(main(['check', filename + '.missing']), 2)
+
+    def test_workspace_first(self):
+        # a package of the base paths is not taken from the snapshot
+        base = os.path.join(self.tmpdir, 'workspace')
+        shutil.copytree('tests/packages/nested_base/geometry_msgs',
+                        os.path.join(base, 'geometry_msgs'))
+        with open(os.path.join(base, 'geometry_msgs', 'msg', 'Point.msg'),
+                  'a') as f:
+            f.write('float64 workspace_field\n')
+        app = TestApp(buildername='text', srcdir='tests/doc/message_expand',
+                      confoverrides={'ros_base_path': [base],
+                                     'ros_index_snapshot': self.filename})
+        try:
+            app.build()
+            text = (app.outdir / 'index.txt').read_text()
+        finally:
+            app.cleanup()
+        self.assertIn('float64 workspace_field', text)
+        # the other packages are still taken from the snapshot
+        self.assertIn('std_msgs/Header header', text)
+
+    def test_stale(self):
+        from sphinxcontrib.ros.snapshot import Snapshot, main
+        base = os.path.join(self.tmpdir, 'base')
+        shutil.copytree('tests/packages/nested_base', base)
+        filename = os.path.join(self.tmpdir, 'stale.db')
+        main(['build', base, '-o', filename])
+        type_file = os.path.join(base, 'std_msgs', 'msg', 'Header.msg')
+        with open(type_file, 'a') as f:
+            f.write('uint32 added\n')
+        snapshot = Snapshot(filename)
+        self.assertTrue(snapshot.load())
+        self.assertTrue(snapshot.is_stale())
+        self.assertEqual(main(['check', filename]), 1)
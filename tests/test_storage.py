@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os
+import unittest
+from sphinx.util.console import strip_colors
+from sphinx_testing import TestApp
+
+
+class TestStorage(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = TestApp(buildername='singlehtml',
+                          srcdir='tests/doc/xref')
+        cls.app.build()
+        cls.storage_app = TestApp(buildername='singlehtml',
+                                  srcdir='tests/doc/xref',
+                                  confoverrides={'ros_storage': 'sqlite'})
+        cls.storage_app.build()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.storage_app.cleanup()
+        cls.app.cleanup()
+
+    def rebuild(self, confoverrides):
+        app = TestApp(buildername='singlehtml', srcdir='tests/doc/xref',
+                      outdir=self.storage_app.outdir,
+                      doctreedir=self.storage_app.doctreedir,
+                      confoverrides=confoverrides)
+        app.build()
+        return app
+
+    def test_storage(self):
+        from sphinxcontrib.ros.storage import SQLiteMapping, STORAGE_FILENAME
+        data = self.storage_app.env.domaindata['ros']
+        self.assertIsInstance(data['objects'], SQLiteMapping)
+        self.assertEqual(data['objects'][('message', 'pkg_b/Point')],
+                         'index')
+        self.assertEqual(data['objects'].pending, {})
+        self.assertTrue(os.path.isfile(os.path.join(
+            self.storage_app.doctreedir, STORAGE_FILENAME)))
+
+    def test_output(self):
+        self.assertEqual(
+            (self.storage_app.outdir / 'index.html').read_text(),
+            (self.app.outdir / 'index.html').read_text())
+        self.assertEqual(self.storage_app._warning.getvalue(),
+                         self.app._warning.getvalue())
+
+    def test_rebuild(self):
+        app = self.rebuild({'ros_storage': 'sqlite'})
+        status = strip_colors(app._status.getvalue())
+        self.assertIn('loading pickled environment... done', status)
+        self.assertIn('0 added, 0 changed, 0 removed', status)
+        # the storage is not used anymore
+        app = self.rebuild({})
+        self.assertIn('[config changed] 1 added',
+                      strip_colors(app._status.getvalue()))
+        self.assertIsInstance(app.env.domaindata['ros']['objects'], dict)
+        self.assertEqual((app.outdir / 'index.html').read_text(),
+                         (self.app.outdir / 'index.html').read_text())
+
+
+class TestSQLiteMapping(unittest.TestCase):
+    def test_mapping(self):
+        import tempfile
+        import shutil
+        from sphinxcontrib.ros.storage import get_storage
+        tmpdir = tempfile.mkdtemp()
+        try:
+            storage = get_storage(os.path.join(tmpdir, 'storage.sqlite'))
+            data = {}
+            storage.open(data)
+            objects = data['objects']
+            docobjects = data['docobjects']
+            objects[('message', u'pkg_a/Point')] = 'index'
+            docobjects.setdefault('index', set()).add(('message', 'a'))
+            storage.commit()
+            generation = storage.generation
+            self.assertIn(('message', 'pkg_a/Point'), objects)
+            self.assertEqual(objects.find_tagged('Point'),
+                             [('message', 'pkg_a/Point')])
+            # changed in place
+            docobjects.setdefault('index', set()).add(('message', 'b'))
+            del objects[('message', 'pkg_a/Point')]
+            self.assertNotIn(('message', 'pkg_a/Point'), objects)
+            storage.commit()
+            self.assertNotEqual(storage.generation, generation)
+            self.assertEqual(docobjects['index'],
+                             set([('message', 'a'), ('message', 'b')]))
+            self.assertEqual(list(objects), [])
+            self.assertTrue(storage.attach(data))
+        finally:
+            shutil.rmtree(tmpdir)
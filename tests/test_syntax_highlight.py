@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function
 
+import fnmatch
+import os
 import unittest
 from sphinx_testing import TestApp
 
@@ -15,3 +17,94 @@ class TestSyntaxHighlight(unittest.TestCase):
 
     def test(self):
         pass
+
+    def test_lexer(self):
+        # the lexer is registered when the document is written
+        html = (self.app.outdir / 'index.html').read_text()
+        self.assertIn('<span class="nb">bool</span>', html)
+
+    def test_highlight_cache(self):
+        # the highlighted rostype code is stored for the next builds
+        from sphinxcontrib.ros.highlighting import (HighlightCache,
+                                                    CACHE_FILENAME)
+        html = (self.app.outdir / 'index.html').read_text()
+        cache = HighlightCache(self.app.doctreedir / CACHE_FILENAME)
+        self.assertTrue(cache.entries)
+        for build, hlsource in cache.entries.values():
+            self.assertEqual(build, 0)
+            self.assertIn(hlsource.encode('utf-8'), html)
+
+
+def make_regex_lexer():
+    u"""Return the former RegexLexer of the type files as a reference
+    """
+    from pygments.lexer import RegexLexer, include, bygroups
+    from pygments.token import (Punctuation, Literal, Text, Comment,
+                                Operator, Name, Number, Keyword)
+    from sphinxcontrib.ros.message import BUILTIN_TYPES
+
+    class ROSTypeRegexLexer(RegexLexer):
+        tokens = {
+            'common': [
+                (r'[ \t]+', Text),
+                (r'#.*$', Comment.Single),
+                (r'[\[\]]', Punctuation),
+                (r'=', Operator),
+                (r'\-?(\d+\.\d*|\.\d+)', Number.Float),
+                (r'\-?\d+', Number.Integer),
+            ],
+            'field': [
+                include('common'),
+                (r'\n', Text, '#pop'),
+                (r'\w+', Name.Property, '#pop'),
+            ],
+            'root': [
+                (r'={80}\n', Keyword),
+                (r'(MSG)(:)(\s*)([\w/]+)(\n)',
+                 bygroups(Keyword, Punctuation, Text, Name.Class, Text)),
+                include('common'),
+                (r'\n', Text),
+                (r'---\n', Keyword),
+                (r'(string)(\s+)([a-zA-Z_]\w*)(\s*)(=)(\s*)(.*)(\s*\n)',
+                 bygroups(Name.Builtin, Text,
+                          Name.Property, Text,
+                          Operator, Text,
+                          Literal.String, Text)),
+                ('(' + '|'.join(BUILTIN_TYPES) + ')', Name.Builtin, 'field'),
+                (r'[\w/]+', Name.Class, 'field'),
+            ],
+        }
+    return ROSTypeRegexLexer()
+
+
+class TestLexer(unittest.TestCase):
+    def get_type_files(self):
+        for dirpath, _, filenames in os.walk('tests'):
+            for filename in sorted(filenames):
+                if any(fnmatch.fnmatch(filename, pattern)
+                       for pattern in ('*.msg', '*.srv', '*.action')):
+                    yield os.path.join(dirpath, filename)
+
+    def test_regex_lexer(self):
+        from sphinxcontrib.ros.lexer import ROSTypeLexer
+        lexer = ROSTypeLexer()
+        reference = make_regex_lexer()
+        texts = [open(filename).read()
+                 for filename in self.get_type_files()]
+        self.assertTrue(texts)
+        texts.append('MSG: std_msgs/Header\n' + '=' * 80 + '\n'
+                     'uint8[ 3 ] a\nuint8 [3] b # comment\n'
+                     'int8 C = -2  # comment\nstring D=\n')
+        for text in texts:
+            tokens = list(lexer.get_tokens(text))
+            self.assertEqual(tokens, list(reference.get_tokens(text)))
+            self.assertTrue(all(value for _, value in tokens))
+
+    def test_numbers(self):
+        from pygments.token import Number
+        from sphinxcontrib.ros.lexer import ROSTypeLexer
+        tokens = list(ROSTypeLexer().get_tokens(
+            'float64 A = 1.5e3\nfloat64 B=-2E-3\nint32 C=0x10\n'))
+        self.assertIn((Number.Float, '1.5e3'), tokens)
+        self.assertIn((Number.Float, '-2E-3'), tokens)
+        self.assertIn((Number.Hex, '0x10'), tokens)
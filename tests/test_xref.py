@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import unittest
+from sphinx_testing import TestApp
+
+
+class TestXref(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = TestApp(buildername='singlehtml',
+                          srcdir='tests/doc/xref')
+        cls.app.build()
+        cls.html = (cls.app.outdir / 'index.html').read_text()
+
+    def test_qualified(self):
+        self.assertIn('href="#message-pkg_b/Point"', self.html)
+
+    def test_package_relative(self):
+        # Point in pkg_a/Pose is pkg_a/Point, not pkg_b/Point
+        self.assertIn('href="#message-pkg_a/Point" title="pkg_a/Point">'
+                      '<em>Point</em>', self.html)
+
+    def test_short_name(self):
+        self.assertIn('href="#message-pkg_a/Pose"', self.html)
+        self.assertIn('href="#message-pkg_c/PoseStamped"', self.html)
+
+    def test_ambiguous(self):
+        self.assertIn("more than one target found for cross-reference "
+                      "u'Point': pkg_a/Point, pkg_b/Point",
+                      self.app._warning.getvalue())